@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares recursive n_ary (the original implementation) with iterative
+and associative (functools.reduce) n_ary, bare and combined with memo,
+for argument lists of different length.
+
+Run from the project directory:
+
+    python benchmarks/bench_n_ary.py --sizes 10,100,900,5000
+"""
+import os
+import sys
+from operator import add
+from optparse import OptionParser
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from deco import memo, n_ary
+
+
+def recursive_n_ary(func):
+    def n_ary_func(x, *args):
+        return x if not args else func(x, n_ary_func(*args))
+
+    return n_ary_func
+
+
+def string_memo(func):
+    cache = {}
+
+    def memoizer(*args, **kwargs):
+        key = str(args) + str(kwargs)
+        if key not in cache.keys():
+            cache[key] = func(*args, **kwargs)
+        return cache[key]
+
+    return memoizer
+
+
+def time_call(make, values: list, repeat_number: int) -> float:
+    """
+    Best time of one call. A new function is made before each call,
+    so that memoized variants compute a result every time.
+    """
+    holder = {}
+
+    def setup():
+        holder['func'] = make()
+
+    return min(repeat(lambda: holder['func'](*values), setup=setup, number=1, repeat=repeat_number))
+
+
+IMPLEMENTATIONS = (
+    ('recursive', lambda: recursive_n_ary(add)),
+    ('iterative', lambda: n_ary(add)),
+    ('associative', lambda: n_ary(add, associative=True)),
+    # memoized calls with new arguments, as in the original foo()
+    ('recursive + str memo', lambda: string_memo(recursive_n_ary(add))),
+    ('iterative + memo', lambda: memo(n_ary(add), maxsize=None)),
+)
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("-s", "--sizes", action="store", default="10,100,900,5000", help="comma separated argument numbers")
+    op.add_option("-r", "--repeat", action="store", type=int, default=50)
+    (opts, args) = op.parse_args()
+
+    sizes = [int(size) for size in opts.sizes.split(',')]
+    print(f'{"implementation":<24}' + ''.join(f'{size:>12}' for size in sizes) + '   us per call')
+    for name, make in IMPLEMENTATIONS:
+        row = f'{name:<24}'
+        for size in sizes:
+            values = list(range(size))
+            try:
+                row += f'{time_call(make, values, opts.repeat) * 1e6:>12.1f}'
+            except RecursionError:
+                row += f'{"recursion":>12}'
+        print(row)
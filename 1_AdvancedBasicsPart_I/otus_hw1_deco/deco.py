@@ -1,7 +1,28 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from functools import update_wrapper, wraps
+import asyncio
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from functools import reduce, update_wrapper, wraps
+from inspect import iscoroutinefunction
+
+DEFAULT_MAXSIZE = 1024
+DEFAULT_MEMO_FILE = 'memo.sqlite3'
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# upper bounds of latency histogram buckets, seconds; the last bucket is unbounded
+LATENCY_BUCKETS = tuple(float(f'{base}e{exponent}') for exponent in range(-7, 1) for base in (1, 2, 5)) + (10.0,)
+
+# separates positional and keyword arguments in a cache key
+_KWARGS_MARK = (object(),)
 
 
 def disable(func):
@@ -29,44 +50,379 @@ def decorator(deco):
 @decorator
 def countcalls(func):
     '''Decorator that counts calls made to the function decorated.'''
-    def wrapper(*args, **kwargs):
-        wrapper.calls += 1
-        res = func(*args, **kwargs)
-        return res
+    if iscoroutinefunction(func):
+        async def wrapper(*args, **kwargs):
+            wrapper.calls += 1
+            return await func(*args, **kwargs)
+    else:
+        def wrapper(*args, **kwargs):
+            wrapper.calls += 1
+            res = func(*args, **kwargs)
+            return res
     wrapper.calls = 0
     # wrapper.__doc__ = func.__doc__
     return wrapper
 
 
-def memo(func):
+def freeze(value):
     '''
-    Memoize a function so that it caches all return values for
-    faster future lookups.
+    Return a hashable equivalent of a value: lists, dicts and sets
+    are converted to tuples and frozensets tagged with their type.
+    Raises TypeError for other unhashable values.
     '''
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return type(value), frozenset((freeze(k), freeze(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return type(value), frozenset(freeze(item) for item in value)
+    hash(value)
+    return value
 
-    cache = func.cache = {}
+
+def make_key(args, kwargs, typed=True):
+    '''
+    Build a cache key of call arguments. Keys of hashable arguments
+    are plain tuples, unhashable containers are frozen. With typed
+    types of arguments are a part of a key, so that f(1), f(1.0)
+    and f(True) are cached separately, though they are equal.
+    Returns None, if arguments can not be made hashable.
+    '''
+    key = args
+    if kwargs:
+        items = tuple(sorted(kwargs.items()))
+        key += _KWARGS_MARK + items
+    if typed:
+        key += tuple(type(value) for value in args)
+        if kwargs:
+            key += tuple(type(value) for _, value in items)
+    try:
+        hash(key)
+        return key
+    except TypeError:
+        pass
+    try:
+        return freeze(key)
+    except TypeError:
+        return None
+
+
+def memo(func=None, *, maxsize=DEFAULT_MAXSIZE, ttl=None, typed=True):
+    '''
+    Memoize a function so that it caches return values for
+    faster future lookups. At most maxsize least recently used
+    results are kept (None means unbounded), results older than
+    ttl seconds are recomputed. Arguments of different types are
+    cached separately, unless typed is False. Calls with arguments,
+    which can not be made hashable, are not cached.
+
+        @memo
+        def fib(n):
+            ...
+
+        @memo(maxsize=128, ttl=60)
+        def get_score(...):
+            ...
+
+    Hits and misses are reported by cache_info(), cache_clear()
+    drops cached results. The cache is thread safe, though
+    concurrent calls with the same arguments may compute a result twice.
+    Coroutine functions are memoized with async_memo.
+    '''
+    if func is None:
+        return lambda f: memo(f, maxsize=maxsize, ttl=ttl, typed=typed)
+    if iscoroutinefunction(func):
+        return async_memo(func, maxsize=maxsize, ttl=ttl, typed=typed)
+
+    cache = OrderedDict()
+    lock = threading.Lock()
+    stats = [0, 0]  # hits, misses
 
     @wraps(func)
     def memoizer(*args, **kwargs):
-        key = str(args) + str(kwargs)
-        if key not in cache.keys():
-            cache[key] = func(*args, **kwargs)
+        key = make_key(args, kwargs, typed)
+        if key is None:
+            with lock:
+                stats[1] += 1
+            return func(*args, **kwargs)
+
+        with lock:
+            entry = cache.get(key)
+            if entry is not None and (ttl is None or entry[0] > time.monotonic()):
+                cache.move_to_end(key)
+                stats[0] += 1
+                return entry[1]
+            stats[1] += 1
+
+        # computed without the lock, so that recursive calls do not block
+        result = func(*args, **kwargs)
+        with lock:
+            cache[key] = (time.monotonic() + ttl if ttl is not None else None, result)
+            cache.move_to_end(key)
+            if maxsize is not None:
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+        return result
+
+    def cache_info():
+        with lock:
+            return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+            stats[:] = [0, 0]
+
+    memoizer.cache = cache
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
+    return memoizer
 
-        return cache[key]
 
+def async_memo(func=None, *, maxsize=DEFAULT_MAXSIZE, ttl=None, typed=True):
+    '''
+    Memoize a coroutine function: awaited results are cached like
+    in memo. Concurrent calls with the same arguments are coalesced,
+    so that they await a single call of a function. Exceptions are
+    not cached. Cancelling one of the callers does not cancel the call
+    awaited by the others. The cache is bound to a single event loop.
+    '''
+    if func is None:
+        return lambda f: async_memo(f, maxsize=maxsize, ttl=ttl, typed=typed)
+
+    cache = OrderedDict()
+    in_flight = {}
+    stats = [0, 0]  # hits, misses
+
+    def store(key, task):
+        del in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        cache[key] = (time.monotonic() + ttl if ttl is not None else None, task.result())
+        cache.move_to_end(key)
+        if maxsize is not None:
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+
+    @wraps(func)
+    async def memoizer(*args, **kwargs):
+        key = make_key(args, kwargs, typed)
+        if key is None:
+            stats[1] += 1
+            return await func(*args, **kwargs)
+
+        entry = cache.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+            cache.move_to_end(key)
+            stats[0] += 1
+            return entry[1]
+
+        task = in_flight.get(key)
+        if task is None:
+            stats[1] += 1
+            task = in_flight[key] = asyncio.ensure_future(func(*args, **kwargs))
+            task.add_done_callback(lambda done: store(key, done))
+        else:
+            stats[0] += 1
+        return await asyncio.shield(task)
+
+    def cache_info():
+        return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+
+    def cache_clear():
+        cache.clear()
+        stats[:] = [0, 0]
+
+    memoizer.cache = cache
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
     return memoizer
 
 
-def n_ary(func):
+def pickle_key(args, kwargs):
+    '''
+    Serialize call arguments into a persistent cache key.
+    Pickles of equal sets of strings may differ between processes,
+    so such arguments may miss the cache of other processes.
+    '''
+    return pickle.dumps((args, tuple(sorted(kwargs.items()))), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def default_memo_path():
+    '''
+    Path of the default persistent_memo database in a per-user cache
+    directory, $XDG_CACHE_HOME/deco or ~/.cache/deco. The directory is
+    created with mode 0700, so that other users can not plant a database.
+    '''
+    directory = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'deco')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid') and os.stat(directory).st_uid != os.getuid():
+        raise PermissionError(f'{directory} is owned by another user')
+    os.chmod(directory, 0o700)
+    return os.path.join(directory, DEFAULT_MEMO_FILE)
+
+
+class PersistentCache:
+    '''
+    Cache of a function in a SQLite database, which is shared by
+    processes and survives restarts. Each process and thread uses
+    its own connection, concurrent writers wait for each other.
+    '''
+
+    def __init__(self, path, namespace, maxsize=None, ttl=None, dumps=pickle.dumps, loads=pickle.loads):
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.local = threading.local()
+        # WAL journal mode is persistent and lets readers work while a value is written
+        self.connection().execute('PRAGMA journal_mode=WAL')
+        with self.connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS memo (namespace TEXT, key BLOB, value BLOB, '
+                               'accessed REAL, expires REAL, PRIMARY KEY (namespace, key))')
+            connection.execute('CREATE INDEX IF NOT EXISTS memo_accessed ON memo (namespace, accessed)')
+
+    def connection(self):
+        # connections are not shared by forked processes
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.connection = sqlite3.connect(self.path, timeout=30)
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def get(self, key):
+        '''Return (True, value) for a cached key, else (False, None).'''
+        now = time.time()
+        connection = self.connection()
+        row = connection.execute('SELECT value, expires FROM memo WHERE namespace = ? AND key = ?',
+                                 (self.namespace, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return False, None
+        if self.maxsize is not None:
+            with connection:
+                connection.execute('UPDATE memo SET accessed = ? WHERE namespace = ? AND key = ?',
+                                   (now, self.namespace, key))
+        return True, self.loads(row[0])
+
+    def set(self, key, value):
+        '''
+        Store a value and evict least recently used values above maxsize.
+        Returns False and stores nothing, if a value can not be serialized.
+        '''
+        try:
+            data = self.dumps(value)
+        except (TypeError, AttributeError, pickle.PicklingError):
+            return False
+        now = time.time()
+        with self.connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?)',
+                               (self.namespace, key, data, now,
+                                now + self.ttl if self.ttl is not None else None))
+            if self.maxsize is not None:
+                connection.execute('DELETE FROM memo WHERE namespace = ? AND key IN '
+                                   '(SELECT key FROM memo WHERE namespace = ? '
+                                   'ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                                   (self.namespace, self.namespace, self.maxsize))
+        return True
+
+    def size(self):
+        return self.connection().execute('SELECT COUNT(*) FROM memo WHERE namespace = ?',
+                                         (self.namespace,)).fetchone()[0]
+
+    def clear(self):
+        with self.connection() as connection:
+            connection.execute('DELETE FROM memo WHERE namespace = ?', (self.namespace,))
+
+
+def persistent_memo(func=None, *, path=None, namespace=None, maxsize=None, ttl=None,
+                    key=pickle_key, dumps=pickle.dumps, loads=pickle.loads):
+    '''
+    Memoize a deterministic function in a SQLite database at path
+    (default_memo_path() by default), so that results are shared
+    by processes and survive restarts.
+
+        @persistent_memo(path='hand_ranks.sqlite3', maxsize=100000)
+        def hand_rank(hand):
+            ...
+
+    Results of a function are kept under namespace, which defaults
+    to a module and a name of a function. key(args, kwargs) serializes
+    call arguments into bytes, dumps and loads serialize results.
+    At most maxsize least recently used results are kept (None means
+    unbounded), results older than ttl seconds are recomputed.
+    Arguments and results, which can not be serialized, are not cached.
+
+    The database is trusted input: results are loaded with pickle.loads
+    by default, so anyone who can write the database can run code in
+    a process, which reads it. Keep it where only its user can write.
+    '''
+    if func is None:
+        return lambda f: persistent_memo(f, path=path, namespace=namespace, maxsize=maxsize, ttl=ttl,
+                                         key=key, dumps=dumps, loads=loads)
+
+    namespace = namespace or f'{func.__module__}.{func.__qualname__}'
+    cache = PersistentCache(path or default_memo_path(), namespace, maxsize, ttl, dumps, loads)
+    stats = [0, 0]  # hits, misses of this process
+
+    @wraps(func)
+    def memoizer(*args, **kwargs):
+        try:
+            cache_key = key(args, kwargs)
+        except (TypeError, AttributeError, pickle.PicklingError):
+            cache_key = None
+
+        if cache_key is not None:
+            found, value = cache.get(cache_key)
+            if found:
+                stats[0] += 1
+                return value
+        stats[1] += 1
+
+        result = func(*args, **kwargs)
+        if cache_key is not None:
+            cache.set(cache_key, result)
+        return result
+
+    def cache_info():
+        return CacheInfo(stats[0], stats[1], maxsize, cache.size())
+
+    def cache_clear():
+        cache.clear()
+        stats[:] = [0, 0]
+
+    memoizer.cache = cache
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
+    return memoizer
+
+
+def n_ary(func=None, *, associative=False):
     '''
     Given binary function f(x, y), return an n_ary function such
     that f(x, y, z) = f(x, f(y,z)), etc. Also allow f(x) = x.
+
+    Arguments are folded from the right in a loop, so long argument
+    lists take linear time and no recursion. For associative functions
+    @n_ary(associative=True) folds them from the left with functools.reduce,
+    which is faster.
     '''
+    if func is None:
+        return lambda f: n_ary(f, associative=associative)
 
-    def n_ary_func(x, *args):
-        return x if not args else func(x, n_ary_func(*args))
+    if associative:
+        def n_ary_func(x, *args):
+            return reduce(func, args, x) if args else x
+    else:
+        def n_ary_func(x, *args):
+            if not args:
+                return x
+            result = args[-1]
+            for i in range(len(args) - 2, -1, -1):
+                result = func(args[i], result)
+            return func(x, result)
 
-    return n_ary_func
+    return update_wrapper(n_ary_func, func)
 
 
 def trace(prefix):
@@ -92,7 +448,7 @@ def trace(prefix):
 
     @decorator
     def real_trace(func):
-        def wrapped(*args, **kwargs):
+        def print_call(args, kwargs):
             name = func.__name__
             arg_string = ", ".join([f'{item}' for item in args])
             kwargs_string = ', '.join([f'{k}={v}' for k, v in kwargs.items()])
@@ -104,12 +460,173 @@ def trace(prefix):
                 print(f'{prefix} {name}({kwargs_string})')
             elif not args and not kwargs:
                 print(f'{prefix} {name}()')
-            return func(*args, **kwargs)
+
+        if iscoroutinefunction(func):
+            async def wrapped(*args, **kwargs):
+                print_call(args, kwargs)
+                return await func(*args, **kwargs)
+        else:
+            def wrapped(*args, **kwargs):
+                print_call(args, kwargs)
+                return func(*args, **kwargs)
         res = wrapped
         return res
     return real_trace
 
 
+class Profile:
+    '''
+    Call statistics of a profiled function. Every call is counted,
+    timings are recorded for sampled calls only.
+    '''
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.sampled = 0
+            self.wall = 0.0
+            self.cpu = 0.0
+            self.max_wall = 0.0
+            self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def count(self):
+        '''Count a call and return a number of calls.'''
+        with self.lock:
+            self.calls += 1
+            return self.calls
+
+    def record(self, wall, cpu):
+        with self.lock:
+            self.sampled += 1
+            self.wall += wall
+            self.cpu += cpu
+            self.max_wall = max(self.max_wall, wall)
+            self.buckets[bisect_left(LATENCY_BUCKETS, wall)] += 1
+
+    def percentile(self, q):
+        '''Upper bound of a histogram bucket, which holds q-th quantile of wall time.'''
+        rank = q * self.sampled
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (self.max_wall,), self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max_wall)
+        return 0.0
+
+    def stats(self):
+        '''
+        Summary of statistics. Cumulative times are extrapolated
+        from sampled calls to all calls.
+        '''
+        with self.lock:
+            scale = self.calls / self.sampled if self.sampled else 0
+            return {
+                'name': self.name,
+                'calls': self.calls,
+                'sampled': self.sampled,
+                'wall': self.wall * scale,
+                'cpu': self.cpu * scale,
+                'wall_per_call': self.wall / self.sampled if self.sampled else 0.0,
+                'cpu_per_call': self.cpu / self.sampled if self.sampled else 0.0,
+                'p50': self.percentile(0.5),
+                'p99': self.percentile(0.99),
+                'buckets': list(self.buckets),
+            }
+
+
+# profiles of all profiled functions by name
+PROFILES = {}
+
+
+def profiled(func=None, *, name=None, rate=1.0):
+    '''
+    Record call count, wall and CPU time and a wall time histogram
+    of a decorated function into PROFILES registry.
+
+        @profiled(rate=0.01)
+        def hand_rank(hand):
+            ...
+
+    Only every round(1 / rate) call is timed, other calls are just
+    counted, rate must be in [0, 1]. With rate=0 calls are only counted
+    and clocks are never read. CPU time is a time of a calling thread.
+    For coroutine functions only wall time is recorded, since other
+    tasks run in the same thread while a call is awaited.
+    See profile_report().
+    '''
+    if not 0 <= rate <= 1:
+        raise ValueError(f'rate must be in [0, 1], got {rate}')
+    if func is None:
+        return lambda f: profiled(f, name=name, rate=rate)
+
+    profile = PROFILES[name or f'{func.__module__}.{func.__qualname__}'] = Profile(name or func.__qualname__, rate)
+    every = round(1 / rate) if rate else 0
+    perf_counter, thread_time = time.perf_counter, time.thread_time
+
+    if not every and iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            profile.count()
+            return await func(*args, **kwargs)
+    elif not every:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile.count()
+            return func(*args, **kwargs)
+    elif iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if profile.count() % every:
+                return await func(*args, **kwargs)
+
+            wall = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.record(perf_counter() - wall, 0.0)
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if profile.count() % every:
+                return func(*args, **kwargs)
+
+            wall, cpu = perf_counter(), thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.record(perf_counter() - wall, thread_time() - cpu)
+
+    wrapper.profile = profile
+    return wrapper
+
+
+def profile_report(sort='wall', file=None):
+    '''
+    Print statistics of all profiled functions sorted by a given
+    statistic in a descending order. Times are in milliseconds.
+    '''
+    file = file or sys.stdout
+    rows = sorted((profile.stats() for profile in PROFILES.values()), key=lambda row: row[sort], reverse=True)
+    print(f'{"function":<30}{"calls":>10}{"sampled":>10}{"wall":>12}{"cpu":>12}'
+          f'{"wall/call":>12}{"cpu/call":>12}{"p50":>10}{"p99":>10}', file=file)
+    for row in rows:
+        print(f'{row["name"]:<30}{row["calls"]:>10}{row["sampled"]:>10}{row["wall"] * 1e3:>12.3f}'
+              f'{row["cpu"] * 1e3:>12.3f}{row["wall_per_call"] * 1e3:>12.4f}{row["cpu_per_call"] * 1e3:>12.4f}'
+              f'{row["p50"] * 1e3:>10.4f}{row["p99"] * 1e3:>10.4f}', file=file)
+
+
+def profile_reset():
+    '''Reset statistics of all profiled functions.'''
+    for profile in PROFILES.values():
+        profile.reset()
+
+
 @countcalls
 @memo
 @n_ary
@@ -0,0 +1,332 @@
+import asyncio
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from deco import (PROFILES, PersistentCache, async_memo, default_memo_path, make_key, memo, n_ary, persistent_memo,
+                  profiled)
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def recorder():
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        return len(calls)
+
+    return func, calls
+
+
+class TestMemo(TestCase):
+    def test_hit_and_miss(self):
+        func, calls = recorder()
+        cached = memo(func)
+        self.assertEqual((cached(1), cached(1), cached(2)), (1, 1, 2))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cached.cache_info(), (1, 2, 1024, 2))
+
+    def test_typed_keys(self):
+        func, calls = recorder()
+        cached = memo(func)
+        self.assertEqual([cached(1), cached(True), cached(1.0), cached(1)], [1, 2, 3, 1])
+        self.assertEqual([cached(x=1), cached(x=1.0)], [4, 5])
+
+        untyped = memo(recorder()[0], typed=False)
+        self.assertEqual([untyped(1), untyped(True), untyped(1.0)], [1, 1, 1])
+
+    def test_unhashable_arguments(self):
+        func, calls = recorder()
+        cached = memo(func)
+        self.assertEqual((cached([1, 2], {'a': {3}}), cached([1, 2], {'a': {3}})), (1, 1))
+        # a list and a tuple of the same items are different keys
+        self.assertEqual(cached((1, 2), {'a': {3}}), 2)
+        # objects, which can not be frozen, are not cached
+        self.assertEqual((cached(bytearray(b'x')), cached(bytearray(b'x'))), (3, 4))
+        self.assertIsNone(make_key((bytearray(b'x'),), {}))
+
+    def test_lru_eviction(self):
+        func, calls = recorder()
+        cached = memo(func, maxsize=2)
+        cached(1)
+        cached(2)
+        # 1 becomes the most recently used, so 2 is evicted by 3
+        cached(1)
+        cached(3)
+        self.assertEqual(list(key[0] for key in cached.cache), [1, 3])
+        calls.clear()
+        cached(1)
+        cached(3)
+        self.assertEqual(calls, [])
+        cached(2)
+        self.assertEqual(calls, [((2,), {})])
+        self.assertEqual(list(key[0] for key in cached.cache), [3, 2])
+
+    def test_ttl(self):
+        clock = FakeClock()
+        func, calls = recorder()
+        with mock.patch('deco.time.monotonic', clock):
+            cached = memo(func, ttl=10)
+            self.assertEqual(cached(1), 1)
+            clock.now += 9.9
+            self.assertEqual(cached(1), 1)
+            clock.now += 0.1
+            self.assertEqual(cached(1), 2)
+            clock.now += 5
+            self.assertEqual(cached(1), 2)
+
+    def test_cache_clear(self):
+        func, calls = recorder()
+        cached = memo(func)
+        cached(1)
+        cached.cache_clear()
+        self.assertEqual(cached.cache_info(), (0, 0, 1024, 0))
+        self.assertEqual(cached(1), 2)
+
+
+class TestAsyncMemo(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.release = None
+
+        async def fetch(value):
+            self.calls.append(value)
+            await self.release.wait()
+            if value < 0:
+                raise ValueError(value)
+            return value * 2
+
+        self.fetch = fetch
+
+    def run_async(self, coroutine_function):
+        async def main():
+            self.release = asyncio.Event()
+            return await coroutine_function()
+
+        return asyncio.run(main())
+
+    def test_memo_dispatches_coroutines(self):
+        async def main():
+            self.release.set()
+            return await memo(self.fetch)(1)
+
+        self.assertEqual(self.run_async(main), 2)
+
+    def test_coalescing(self):
+        cached = async_memo(self.fetch)
+
+        async def main():
+            waiters = [asyncio.ensure_future(cached(1)) for _ in range(5)]
+            await asyncio.sleep(0)
+            self.release.set()
+            results = await asyncio.gather(*waiters)
+            return results + [await cached(1)]
+
+        self.assertEqual(self.run_async(main), [2] * 6)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(cached.cache_info(), (5, 1, 1024, 1))
+
+    def test_cancelled_waiter(self):
+        cached = async_memo(self.fetch)
+
+        async def main():
+            first, second = asyncio.ensure_future(cached(1)), asyncio.ensure_future(cached(1))
+            await asyncio.sleep(0)
+            first.cancel()
+            await asyncio.sleep(0)
+            self.release.set()
+            result = await second
+            return first.cancelled(), result
+
+        # the call awaited by the other waiter is not cancelled and its result is cached
+        self.assertEqual(self.run_async(main), (True, 2))
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(len(cached.cache), 1)
+
+    def test_exceptions_are_not_cached(self):
+        cached = async_memo(self.fetch)
+
+        async def main():
+            self.release.set()
+            results = await asyncio.gather(cached(-1), cached(-1), return_exceptions=True)
+            with self.assertRaises(ValueError):
+                await cached(-1)
+            return results
+
+        results = self.run_async(main)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(self.calls, [-1, -1])
+        self.assertEqual(len(cached.cache), 0)
+
+
+class TestPersistentMemo(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'memo.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shared_by_processes(self):
+        script = ('import deco; double = deco.persistent_memo(lambda x: x * 2, path=%r, namespace="double"); '
+                  'print(double(21))' % self.path)
+        output = subprocess.run([sys.executable, '-c', script], cwd=PROJECT_DIR, check=True, capture_output=True,
+                                text=True, timeout=60).stdout
+        self.assertEqual(output.strip(), '42')
+
+        func, calls = recorder()
+        cached = persistent_memo(func, path=self.path, namespace='double')
+        self.assertEqual(cached(21), 42)
+        self.assertEqual(calls, [])
+        self.assertEqual(cached(1), 1)
+        self.assertEqual(cached.cache_info(), (1, 1, None, 2))
+
+    def test_shared_by_connections(self):
+        first = PersistentCache(self.path, 'namespace')
+        second = PersistentCache(self.path, 'namespace')
+        other = PersistentCache(self.path, 'other')
+        self.assertTrue(first.set(b'key', [1, 2]))
+        self.assertEqual(second.get(b'key'), (True, [1, 2]))
+        self.assertEqual(other.get(b'key'), (False, None))
+
+    def test_ttl(self):
+        clock = FakeClock()
+        with mock.patch('deco.time.time', clock):
+            cache = PersistentCache(self.path, 'ttl', ttl=10)
+            cache.set(b'key', 1)
+            clock.now += 9.9
+            self.assertEqual(cache.get(b'key'), (True, 1))
+            clock.now += 0.1
+            self.assertEqual(cache.get(b'key'), (False, None))
+
+    def test_maxsize(self):
+        clock = FakeClock()
+        with mock.patch('deco.time.time', clock):
+            cache = PersistentCache(self.path, 'lru', maxsize=2)
+            for key in (b'a', b'b'):
+                cache.set(key, key)
+                clock.now += 1
+            # a becomes the most recently used, so b is evicted by c
+            cache.get(b'a')
+            clock.now += 1
+            cache.set(b'c', b'c')
+            self.assertEqual(cache.size(), 2)
+            self.assertEqual([cache.get(key)[0] for key in (b'a', b'b', b'c')], [True, False, True])
+
+    def test_unpicklable_result(self):
+        cached = persistent_memo(lambda n: (i for i in range(n)), path=self.path, namespace='generator')
+        self.assertEqual(list(cached(3)), [0, 1, 2])
+        self.assertEqual(list(cached(3)), [0, 1, 2])
+        self.assertEqual(cached.cache.size(), 0)
+
+    def test_default_path(self):
+        cache_home = os.path.join(self.directory.name, 'cache')
+        os.makedirs(os.path.join(cache_home, 'deco'), mode=0o755)
+        with mock.patch.dict(os.environ, XDG_CACHE_HOME=cache_home):
+            path = default_memo_path()
+        self.assertEqual(path, os.path.join(cache_home, 'deco', 'memo.sqlite3'))
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+
+
+def recursive_n_ary(func):
+    """
+    The initial recursive n_ary.
+    """
+    def n_ary_func(x, *args):
+        return x if not args else func(x, n_ary_func(*args))
+
+    return n_ary_func
+
+
+class TestNAry(TestCase):
+    def test_right_fold(self):
+        def concat(a, b):
+            return f'({a}{b})'
+
+        folded = n_ary(concat)
+        self.assertEqual(folded('a', 'b', 'c', 'd'), '(a(b(cd)))')
+        for n in range(1, 8):
+            args = 'abcdefg'[:n]
+            self.assertEqual(folded(*args), recursive_n_ary(concat)(*args))
+        self.assertEqual(folded.__name__, 'concat')
+
+    def test_single_argument(self):
+        self.assertEqual(n_ary(lambda a, b: a - b)(5), 5)
+        self.assertEqual(n_ary(lambda a, b: a - b, associative=True)(5), 5)
+
+    def test_deep_call(self):
+        args = range(5000)
+        self.assertRaises(RecursionError, recursive_n_ary(lambda a, b: a + b), *args)
+        self.assertEqual(n_ary(lambda a, b: a + b)(*args), sum(args))
+        # a - (b - (c - ...)) = a - b + c - ...
+        alternating = sum(arg if i % 2 == 0 else -arg for i, arg in enumerate(args))
+        self.assertEqual(n_ary(lambda a, b: a - b)(*args), alternating)
+
+    def test_associative(self):
+        def add(a, b):
+            return a + b
+
+        for args in ((1,), (1, 2), tuple(range(100)), ('a', 'b', 'c')):
+            self.assertEqual(n_ary(add, associative=True)(*args), n_ary(add)(*args))
+        self.assertEqual(n_ary(add, associative=True)(*range(5000)), sum(range(5000)))
+        # a list is concatenated in the same order by both folds
+        self.assertEqual(n_ary(add, associative=True)([1], [2], [3]), n_ary(add)([1], [2], [3]))
+
+
+class TestProfiled(TestCase):
+    def tearDown(self):
+        PROFILES.clear()
+
+    def test_rate_is_validated(self):
+        for rate in (-0.5, -1, 1.5, 5):
+            self.assertRaises(ValueError, profiled, rate=rate)
+            self.assertRaises(ValueError, profiled, lambda: None, rate=rate)
+
+    def test_count_only(self):
+        # clocks are bound, when a function is decorated
+        with mock.patch('deco.time.perf_counter') as perf_counter, mock.patch('deco.time.thread_time') as thread_time:
+            func = profiled(lambda x: x * 2, name='counted', rate=0)
+            results = [func(x) for x in range(10)]
+        self.assertEqual(results, [x * 2 for x in range(10)])
+        stats = func.profile.stats()
+        self.assertEqual((stats['calls'], stats['sampled'], stats['wall']), (10, 0, 0))
+        self.assertIs(PROFILES['counted'], func.profile)
+        perf_counter.assert_not_called()
+        thread_time.assert_not_called()
+
+        async def fetch(value):
+            return value
+
+        coroutine_func = profiled(fetch, rate=0)
+        self.assertEqual(asyncio.run(coroutine_func(1)), 1)
+        self.assertEqual((coroutine_func.profile.calls, coroutine_func.profile.sampled), (1, 0))
+
+    def test_sampling(self):
+        func = profiled(lambda: None, name='sampled', rate=0.25)
+        for _ in range(100):
+            func()
+        stats = func.profile.stats()
+        self.assertEqual((stats['calls'], stats['sampled']), (100, 25))
+        self.assertIs(PROFILES['sampled'], func.profile)
+
+    def test_threads(self):
+        func = profiled(lambda: None, rate=0.1)
+        threads = [threading.Thread(target=lambda: [func() for _ in range(10000)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((func.profile.calls, func.profile.sampled), (80000, 8000))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Exhaustive correctness check and benchmark of hand ranking.
+
+Ranks all 2,598,960 five card hands and checks numbers of hands per category against the known frequency table,
+then ranks a random sample of 7 card hands and checks, that the 7 card evaluator, best_hand and hand_rank agree
+with ranking every 5 card combination. With --reference every hand is also compared with reference_rank(),
+a rule based ranker of card strings, which shares no code with poker.py, so errors of classification
+and of lookup tables are both found.
+Exits with status 1 on any mismatch.
+
+Run from the project directory:
+
+    python benchmarks/bench_poker.py --sample 100000
+"""
+import os
+import random
+import sys
+import time
+from collections import Counter
+from itertools import combinations
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from poker import CARD_CODES, HAND_CLASSES, best_hand, decode_hand, encode_hand, evaluate, evaluate5, hand_rank
+
+CATEGORIES = ("high card", "pair", "two pair", "three of a kind", "straight", "flush", "full house",
+              "four of a kind", "straight flush")
+# numbers of 5 card hands per category out of 2,598,960
+FIVE_CARD_FREQUENCIES = (1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 40)
+# numbers of 7 card hands per category out of 133,784,560
+SEVEN_CARD_FREQUENCIES = (23294460, 58627800, 31433400, 6461620, 6180020, 4047644, 3473184, 224848, 41584)
+RANK_CHARS = "23456789TJQKA"
+WHEEL = [12, 3, 2, 1, 0]
+
+
+def reference_rank(hand: list) -> tuple:
+    """
+    Ranks 5 cards by rules, like the initial string based hand_rank, with a wheel straight
+    and kinds of twos (rank 0) fixed. Values have the form of poker.HAND_CLASSES.
+
+    :param hand: a list of 5 cards, like: ['6C', '7C', '8C', '9C', 'TC'].
+    """
+    ranks = sorted((RANK_CHARS.index(card[0]) for card in hand), reverse=True)
+    is_flush = len({card[1] for card in hand}) == 1
+    is_straight = len(set(ranks)) == 5 and (ranks[0] - ranks[4] == 4 or ranks == WHEEL)
+    high = 3 if ranks == WHEEL else ranks[0]
+    pairs = sorted({rank for rank in ranks if ranks.count(rank) == 2}, reverse=True)
+
+    def kind(n: int):
+        return next((rank for rank in ranks if ranks.count(rank) == n), None)
+
+    if is_straight and is_flush:
+        return (8, high)
+    elif kind(4) is not None:
+        return (7, kind(4), kind(1))
+    elif kind(3) is not None and pairs:
+        return (6, kind(3), pairs[0])
+    elif is_flush:
+        return (5, tuple(ranks))
+    elif is_straight:
+        return (4, high)
+    elif kind(3) is not None:
+        return (3, kind(3), tuple(ranks))
+    elif len(pairs) == 2:
+        return (2, tuple(pairs), tuple(ranks))
+    elif pairs:
+        return (1, pairs[0], tuple(ranks))
+    else:
+        return (0, tuple(ranks))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def report(title: str, counts: Counter, frequencies: tuple, exact: bool) -> bool:
+    print(title)
+    total, expected_total = sum(counts.values()), sum(frequencies)
+    ok = True
+    for category, (name, expected) in enumerate(zip(CATEGORIES, frequencies)):
+        if exact:
+            match = counts[category] == expected
+            ok = ok and match
+            print(f'  {name:<16}{counts[category]:>10}{expected:>10}  {"ok" if match else "MISMATCH"}')
+        else:
+            print(f'  {name:<16}{counts[category] / total:>10.4%}{expected / expected_total:>10.4%}')
+    return ok
+
+
+def check_five_card_hands(reference: bool) -> bool:
+    deck = list(CARD_CODES.values())
+    hands = list(combinations(deck, 5))
+    print(f'{len(hands)} five card hands')
+
+    scores, seconds = timed(lambda: [evaluate5(*codes) for codes in hands])
+    print(f'  evaluate5       {seconds:8.2f} s  {len(hands) / seconds:12,.0f} hands/s')
+
+    card_hands = [decode_hand(codes) for codes in hands]
+    ranks, seconds = timed(lambda: [hand_rank(hand) for hand in card_hands])
+    print(f'  hand_rank       {seconds:8.2f} s  {len(hands) / seconds:12,.0f} hands/s')
+
+    ok = True
+    if reference:
+        mismatches = [hand for hand, score in zip(card_hands, scores) if HAND_CLASSES[score] != reference_rank(hand)]
+        print(f'  {len(mismatches)} mismatches with reference ranking {mismatches[:3]}')
+        ok = not mismatches
+
+    counts = Counter(HAND_CLASSES[score][0] for score in scores)
+    return report('five card hands per category: counted, expected', counts, FIVE_CARD_FREQUENCIES, True) and ok
+
+
+def check_seven_card_hands(sample: int, seed: int, reference: bool) -> bool:
+    rnd = random.Random(seed)
+    deck = list(CARD_CODES)
+    card_hands = [rnd.sample(deck, 7) for _ in range(sample)]
+    hands = [encode_hand(hand) for hand in card_hands]
+    print(f'{sample} random seven card hands')
+
+    # non-flush 7 card scores are memoized, so the first pass also fills the memo
+    for name in ('evaluate (cold)', 'evaluate (warm)'):
+        scores, seconds = timed(lambda: [evaluate(codes) for codes in hands])
+        print(f'  {name:<16}{seconds:8.2f} s  {sample / seconds:12,.0f} hands/s')
+    ranks, seconds = timed(lambda: [hand_rank(hand) for hand in card_hands])
+    print(f'  hand_rank       {seconds:8.2f} s  {sample / seconds:12,.0f} hands/s')
+    best_hands, seconds = timed(lambda: [best_hand(hand) for hand in card_hands])
+    print(f'  best_hand       {seconds:8.2f} s  {sample / seconds:12,.0f} hands/s')
+
+    mismatches = []
+    for hand, codes, score, rank, best in zip(card_hands, hands, scores, ranks, best_hands):
+        expected = max(evaluate5(*subset) for subset in combinations(codes, 5))
+        if score != expected or hand_rank(best) != rank:
+            mismatches.append(hand)
+        elif reference and rank != max(reference_rank(subset) for subset in combinations(hand, 5)):
+            mismatches.append(hand)
+    print(f'  {len(mismatches)} mismatches with ranking of every 5 card combination {mismatches[:3]}')
+
+    counts = Counter(rank[0] for rank in ranks)
+    report('seven card hands per category: sampled, expected', counts, SEVEN_CARD_FREQUENCIES, False)
+    return not mismatches
+
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("-n", "--sample", action="store", type=int, default=100000, help="number of seven card hands")
+    op.add_option("-s", "--seed", action="store", type=int, default=0)
+    op.add_option("--reference", action="store_true", default=False,
+                  help="compare every hand with a rule based ranker of card strings")
+    op.add_option("--skip-exhaustive", action="store_true", default=False, help="do not rank all five card hands")
+    (opts, args) = op.parse_args()
+
+    ok = True
+    if not opts.skip_exhaustive:
+        ok = check_five_card_hands(opts.reference)
+    ok = check_seven_card_hands(opts.sample, opts.seed, opts.reference) and ok
+    sys.exit(0 if ok else 1)
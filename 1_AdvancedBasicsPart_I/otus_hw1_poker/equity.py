@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo equity of hole cards against random opponents' hands.
+
+Trials are run in batches, which are sharded across a process pool. Each batch has its own random generator
+seeded by a seed of a simulation and a batch number, so results do not depend on a number of processes.
+Simulation stops, when a standard error of equity drops below a target, or when trials limit is reached.
+
+    python equity.py AS KS --opponents 3 --board "QS JS 2D" --error 0.001
+"""
+import math
+import random
+import sys
+import time
+from collections import namedtuple
+from multiprocessing import Pool
+from optparse import OptionParser
+
+from poker import CARD_CODES, encode_hand, evaluate_hands
+
+BATCH_SIZE = 10000
+MAX_TRIALS = 10 ** 7
+TARGET_ERROR = 0.001
+
+# equity of a hand, standard error of equity and shares of won, tied and lost trials
+Equity = namedtuple('Equity', ['equity', 'error', 'win', 'tie', 'loss', 'trials', 'seconds'])
+# sums over trials of a batch: equity, squared equity, wins, ties
+BatchResult = namedtuple('BatchResult', ['trials', 'equity', 'equity_squared', 'wins', 'ties'])
+
+
+def run_batch(args) -> BatchResult:
+    """
+    Deals 'trials' random opponents' hands and missing board cards.
+    A won trial gives equity of 1, a trial tied with k opponents gives 1 / (k + 1).
+
+    :param args: tuple of hole cards, board cards, number of opponents, number of trials, seed and batch number.
+    """
+    hole, board, opponents, trials, seed, batch = args
+    rnd = random.Random(f'{seed}:{batch}')
+    hole, board = encode_hand(hole), encode_hand(board)
+    deck = [code for code in CARD_CODES.values() if code not in hole and code not in board]
+    missing = 5 - len(board)
+
+    equity = equity_squared = 0.0
+    wins = ties = 0
+    for _ in range(trials):
+        dealt = rnd.sample(deck, missing + 2 * opponents)
+        full_board = board + dealt[:missing]
+        scores = evaluate_hands([hole + full_board] + [dealt[i:i + 2] + full_board
+                                                       for i in range(missing, len(dealt), 2)])
+        best = max(scores)
+        if scores[0] == best:
+            winners = scores.count(best)
+            share = 1.0 / winners
+            equity += share
+            equity_squared += share * share
+            if winners == 1:
+                wins += 1
+            else:
+                ties += 1
+
+    return BatchResult(trials, equity, equity_squared, wins, ties)
+
+
+def simulate(hole: list, opponents: int = 1, board: list = (), target_error: float = TARGET_ERROR,
+             max_trials: int = MAX_TRIALS, batch_size: int = BATCH_SIZE, processes: int = None, seed: int = 0,
+             progress=None) -> Equity:
+    """
+    Estimates equity of hole cards against random hands of opponents.
+
+    :param hole: 2 hole cards, like ['AS', 'KS'];
+    :param opponents: number of opponents;
+    :param board: 0 to 5 known board cards;
+    :param target_error: standard error of equity, at which simulation stops;
+    :param max_trials: limit of trials;
+    :param batch_size: number of trials per batch;
+    :param processes: size of a process pool, defaults to a number of CPUs;
+    :param seed: seed of a simulation;
+    :param progress: callable, which is called with an intermediate Equity after each batch;
+    :return: Equity.
+    """
+    hole, board = list(hole), list(board)
+    if len(hole) != 2 or len(board) > 5 or len(set(hole + board)) != len(hole + board):
+        raise ValueError('2 distinct hole cards and up to 5 distinct board cards are expected.')
+    if not 1 <= opponents <= (50 - len(board)) // 2:
+        raise ValueError(f'Number of opponents should be from 1 to {(50 - len(board)) // 2}.')
+
+    batches = math.ceil(max_trials / batch_size)
+    tasks = ((hole, board, opponents, min(batch_size, max_trials - batch * batch_size), seed, batch)
+             for batch in range(batches))
+
+    started = time.perf_counter()
+    trials = wins = ties = 0
+    equity_sum = equity_squared_sum = 0.0
+    result = None
+    with Pool(processes) as pool:
+        # batches are consumed in order, so a stopping point does not depend on a number of processes
+        for batch_result in pool.imap(run_batch, tasks):
+            trials += batch_result.trials
+            wins += batch_result.wins
+            ties += batch_result.ties
+            equity_sum += batch_result.equity
+            equity_squared_sum += batch_result.equity_squared
+
+            equity = equity_sum / trials
+            variance = max(equity_squared_sum / trials - equity * equity, 0.0)
+            error = math.sqrt(variance / trials)
+            result = Equity(equity, error, wins / trials, ties / trials, 1 - (wins + ties) / trials, trials,
+                            time.perf_counter() - started)
+            if progress:
+                progress(result)
+            if error <= target_error and trials >= batch_size:
+                break
+
+    return result
+
+
+def print_progress(result: Equity):
+    print(f'{result.trials:>10} trials  equity {result.equity:.4f} ± {result.error:.4f}  '
+          f'{result.trials / result.seconds:,.0f} trials/s', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    op = OptionParser(usage="%prog [options] CARD CARD")
+    op.add_option("-o", "--opponents", action="store", type=int, default=1)
+    op.add_option("-b", "--board", action="store", default="", help='known board cards, like "QS JS 2D"')
+    op.add_option("-e", "--error", action="store", type=float, default=TARGET_ERROR,
+                  help="standard error of equity, at which simulation stops")
+    op.add_option("-n", "--max-trials", action="store", type=int, default=MAX_TRIALS)
+    op.add_option("--batch-size", action="store", type=int, default=BATCH_SIZE)
+    op.add_option("-p", "--processes", action="store", type=int, default=None)
+    op.add_option("-s", "--seed", action="store", type=int, default=0)
+    op.add_option("-q", "--quiet", action="store_true", default=False, help="do not report progress")
+    (opts, args) = op.parse_args()
+    if len(args) != 2:
+        op.error("2 hole cards are expected")
+
+    try:
+        result = simulate(args, opponents=opts.opponents, board=opts.board.split(), target_error=opts.error,
+                          max_trials=opts.max_trials, batch_size=opts.batch_size, processes=opts.processes,
+                          seed=opts.seed, progress=None if opts.quiet else print_progress)
+    except (ValueError, KeyError) as e:
+        op.error(f"invalid cards: {e}")
+
+    print(f'equity {result.equity:.4f} ± {result.error:.4f}, win {result.win:.4f}, tie {result.tie:.4f}, '
+          f'loss {result.loss:.4f}, {result.trials} trials in {result.seconds:.2f} s '
+          f'({result.trials / result.seconds:,.0f} trials/s)')
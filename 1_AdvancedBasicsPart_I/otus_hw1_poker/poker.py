@@ -58,71 +58,301 @@
 # * `two_pair` - should return two ranks, which have 2 card each, if there are, else returns None.
 # -----------------
 
-from itertools import permutations
+from itertools import combinations, combinations_with_replacement, product
 
+# -----------------
+# Card encoding and hand evaluation tables.
+#
+# Cards are encoded as integers in Cactus Kev's format:
+# +--------+--------+--------+--------+
+# |xxxbbbbb|bbbbbbbb|shdcrrrr|xxpppppp|
+# +--------+--------+--------+--------+
+# b - one bit per rank, s/h/d/c - one bit per suit, r - rank (0..12), p - prime number of rank.
+#
+# Every 5 card hand belongs to one of 7462 distinct hand classes. Classes are ordered by hand_rank value,
+# and a hand score is an index of its class, so that better hands have higher scores.
+# Scores are looked up by rank bits for flushes and for hands of 5 distinct ranks,
+# and by a product of rank primes for hands with paired ranks.
+# -----------------
 
-def hand_rank(hand: str) -> tuple:
+RANKS = "23456789TJQKA"
+SUITS = "CDHS"
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+WHEEL_MASK = 0b1000000001111
+# suits, which a joker may substitute
+JOKER_SUITS = {"?B": (SUITS.index("C"), SUITS.index("S")), "?R": (SUITS.index("D"), SUITS.index("H"))}
+# rank masks of all straights with their highest ranks, from the best one to a wheel
+STRAIGHT_MASKS = [(0b11111 << (high - 4), high) for high in range(12, 3, -1)] + [(WHEEL_MASK, 3)]
+
+
+def make_card(rank: int, suit: int) -> int:
     """
-    Возвращает значение определяющее ранг 'руки'.
-    Returns a rank of a given hand.
+    Returns integer code of a card of given rank (0..12) and suit (0..3).
+    """
+    return 1 << (16 + rank) | 1 << (12 + suit) | rank << 8 | PRIMES[rank]
 
-    :param hand: a list of 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', 'JS'].
+
+def encode_card(card: str) -> int:
+    """
+    Returns integer code of a card, like 'AS'.
+    """
+    return make_card(RANKS.index(card[0]), SUITS.index(card[1]))
+
+
+CARD_CODES = {rank + suit: encode_card(rank + suit) for rank in RANKS for suit in SUITS}
+CODE_CARDS = {code: card for card, code in CARD_CODES.items()}
+# codes of cards by rank and suit
+DECK = [[make_card(rank, suit) for suit in range(len(SUITS))] for rank in range(len(RANKS))]
+
+
+def encode_hand(hand: list) -> list:
+    return [CARD_CODES[card] for card in hand]
+
+
+def decode_hand(codes) -> list:
+    return [CODE_CARDS[code] for code in codes]
+
+
+# -----------------
+# Bitwise hand features of encoded cards.
+# -----------------
+
+def rank_mask(codes) -> int:
     """
+    Returns bits of ranks of encoded cards.
+    """
+    bits = 0
+    for code in codes:
+        bits |= code
+    return bits >> 16
+
+
+# highest rank of the best straight by rank bits, or -1, if there is no straight
+STRAIGHT_HIGHS = [-1] * 8192
+for _bits in range(8192):
+    STRAIGHT_HIGHS[_bits] = next((high for mask, high in STRAIGHT_MASKS if _bits & mask == mask), -1)
 
-    ranks = card_ranks(hand)
-    if straight(ranks) and flush(hand):
-        return (8, max(ranks))
-    elif kind(4, ranks):
-        return (7, kind(4, ranks), kind(1, ranks))
-    elif kind(3, ranks) and kind(2, ranks):
-        return (6, kind(3, ranks), kind(2, ranks))
-    elif flush(hand):
-        return (5, ranks)
-    elif straight(ranks):
-        return (4, max(ranks))
-    elif kind(3, ranks):
-        return (3, kind(3, ranks), ranks)
-    elif two_pair(ranks):
-        return (2, two_pair(ranks), ranks)
-    elif kind(2, ranks):
-        return (1, kind(2, ranks), ranks)
+# 3-bit suit counters of a hand, where one of suits has 5 or more cards, and such suit bits
+FLUSH_SUITS = [0] * 4096
+for _counters in range(4096):
+    for _suit in range(4):
+        if _counters >> 3 * _suit & 7 >= 5:
+            FLUSH_SUITS[_counters] = 1 << (12 + _suit)
+
+
+def flush_suit(codes) -> int:
+    """
+    Returns suit bit of a suit, which has 5 or more cards out of up to 7 encoded cards, or 0.
+    """
+    counters = 0
+    for code in codes:
+        # suit bit 1, 2, 4, 8 cubed gives counter increment 1, 8, 64, 512
+        counters += (code >> 12 & 0xF) ** 3
+    return FLUSH_SUITS[counters]
+
+
+def rank_histogram(ranks) -> list:
+    """
+    Returns number of cards per rank.
+
+    :param ranks: list of ranks, like [10, 10, 8, 6, 5, 1, 1].
+    """
+    counts = [0] * len(RANKS)
+    for rank in ranks:
+        counts[rank] += 1
+    return counts
+
+
+def classify(ranks: tuple, is_flush: bool) -> tuple:
+    """
+    Returns hand_rank value of 5 cards with given ranks. Values are shared by all hands of a class,
+    so they are built of tuples only.
+
+    :param ranks: ranks sorted in a descending order, like (12, 12, 8, 5, 1);
+    :param is_flush: True, if all cards share same suit.
+    """
+    counts = rank_histogram(ranks)
+    groups = sorted(((counts[rank], rank) for rank in set(ranks)), reverse=True)
+    high = STRAIGHT_HIGHS[rank_bits(ranks)]
+    is_straight = high >= 0
+
+    if is_straight and is_flush:
+        return (8, high)
+    elif groups[0][0] == 4:
+        return (7, groups[0][1], groups[1][1])
+    elif groups[0][0] == 3 and groups[1][0] == 2:
+        return (6, groups[0][1], groups[1][1])
+    elif is_flush:
+        return (5, tuple(ranks))
+    elif is_straight:
+        return (4, high)
+    elif groups[0][0] == 3:
+        return (3, groups[0][1], tuple(ranks))
+    elif groups[0][0] == 2 and groups[1][0] == 2:
+        return (2, (groups[0][1], groups[1][1]), tuple(ranks))
+    elif groups[0][0] == 2:
+        return (1, groups[0][1], tuple(ranks))
     else:
-        return (0, ranks)
+        return (0, tuple(ranks))
+
+
+def rank_bits(ranks) -> int:
+    bits = 0
+    for rank in ranks:
+        bits |= 1 << rank
+    return bits
+
+
+def rank_product(ranks) -> int:
+    product = 1
+    for rank in ranks:
+        product *= PRIMES[rank]
+    return product
+
+
+def build_tables() -> tuple:
+    """
+    Enumerates all 7462 hand classes and builds score lookup tables.
+
+    :return: hand classes in score order, flush scores and distinct ranks scores by rank bits,
+    paired ranks scores by rank primes product.
+    """
+    hands = []
+    # descending ranks give non-increasing rank tuples
+    for ranks in combinations_with_replacement(range(12, -1, -1), 5):
+        if max(ranks.count(rank) for rank in ranks) > 4:
+            continue
+        hands.append((classify(ranks, False), ranks, False))
+        if len(set(ranks)) == 5:
+            hands.append((classify(ranks, True), ranks, True))
+    hands.sort(key=lambda hand: hand[0])
+
+    hand_classes, flush_scores, unique_scores, paired_scores = [], [-1] * 8192, [-1] * 8192, {}
+    for score, (hand_class, ranks, is_flush) in enumerate(hands):
+        hand_classes.append(hand_class)
+        if is_flush:
+            flush_scores[rank_bits(ranks)] = score
+        elif len(set(ranks)) == 5:
+            unique_scores[rank_bits(ranks)] = score
+        else:
+            paired_scores[rank_product(ranks)] = score
+    return hand_classes, flush_scores, unique_scores, paired_scores
+
+
+HAND_CLASSES, FLUSH_SCORES, UNIQUE_SCORES, PAIRED_SCORES = build_tables()
+
+
+def evaluate5(a: int, b: int, c: int, d: int, e: int) -> int:
+    """
+    Returns score of 5 encoded cards. Better hands have higher scores.
+    """
+    bits = (a | b | c | d | e) >> 16
+    if a & b & c & d & e & 0xF000:
+        return FLUSH_SCORES[bits]
+    score = UNIQUE_SCORES[bits]
+    if score >= 0:
+        return score
+    return PAIRED_SCORES[(a & 0xFF) * (b & 0xFF) * (c & 0xFF) * (d & 0xFF) * (e & 0xFF)]
+
+
+# best scores of hands of 6 and 7 cards without a flush, by rank primes product, filled on demand
+BEST_PAIRED_SCORES = {}
+# best scores of flush cards by rank bits, for 5 to 7 cards of a suit
+BEST_FLUSH_SCORES = [-1] * 8192
+for _bits in range(8192):
+    _ranks = [rank for rank in range(13) if _bits >> rank & 1]
+    if 5 <= len(_ranks) <= 7:
+        BEST_FLUSH_SCORES[_bits] = max(FLUSH_SCORES[rank_bits(subset)] for subset in combinations(_ranks, 5))
+
+
+def evaluate(codes) -> int:
+    """
+    Returns score of the best 5 card hand out of 5 to 7 encoded cards.
+    A hand with 5 or more cards of one suit is scored by bits of their ranks,
+    any other hand is scored by a product of rank primes.
+    """
+    if len(codes) == 5:
+        return evaluate5(*codes)
+
+    suit = flush_suit(codes)
+    if suit:
+        bits = 0
+        for code in codes:
+            if code & suit:
+                bits |= code
+        return BEST_FLUSH_SCORES[bits >> 16]
+
+    product = 1
+    for code in codes:
+        product *= code & 0xFF
+    score = BEST_PAIRED_SCORES.get(product)
+    if score is None:
+        score = BEST_PAIRED_SCORES[product] = max(_unsuited_score(subset) for subset in combinations(codes, 5))
+    return score
+
+
+def _unsuited_score(codes) -> int:
+    """
+    Score of 5 cards, ignoring suits.
+    """
+    bits = 0
+    product = 1
+    for code in codes:
+        bits |= code >> 16
+        product *= code & 0xFF
+    score = UNIQUE_SCORES[bits]
+    return score if score >= 0 else PAIRED_SCORES[product]
+
+
+def evaluate_hands(hands) -> list:
+    """
+    Returns scores of many encoded hands.
+
+    :param hands: iterable of lists of 5 to 7 encoded cards.
+    """
+    return [evaluate(codes) for codes in hands]
+
+
+def rank_hands(hands) -> list:
+    """
+    Returns ranks of many hands.
+
+    :param hands: iterable of lists of 5 to 7 cards, like [['6C', '7C', '8C', '9C', 'TC'], ...].
+    """
+    return [HAND_CLASSES[score] for score in evaluate_hands(encode_hand(hand) for hand in hands)]
+
+
+def hand_rank(hand: list) -> tuple:
+    """
+    Возвращает значение определяющее ранг 'руки'.
+    Returns a rank of a given hand. For hands of 6 and 7 cards a rank of the best 5 card hand is returned.
+
+    :param hand: a list of 5 to 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', 'JS'].
+    """
+
+    return HAND_CLASSES[evaluate(encode_hand(hand))]
 
 
 def card_ranks(hand: str) -> list:
     """
     Возвращает список рангов (его числовой эквивалент), отсортированный от большего к меньшему.
-    Returns a list of numerical equivalent of card ranks in a descending order.
+    Returns a list of numerical equivalent of card ranks in a descending order. Jokers are skipped.
 
     :param hand: a list of 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', 'JS'].
     """
 
-    # define ranks
-    rankables = "23456789TJQKA"
-    ranks = {rankables[rank]: rank for rank in range(len(rankables))}
-
-    # return sorted ranks of rankable cards
-    return sorted([ranks[card[0]] for card in hand if card[0] != "?"], reverse=True)
+    return sorted((CARD_CODES[card] >> 8 & 0xF for card in hand if card[0] != "?"), reverse=True)
 
 
 def flush(hand: str) -> bool:
     """
-    Возвращает True, если все карты одной масти.
-    Returns True, if all cards share same suit.
+    Возвращает True, если 5 или больше карт одной масти.
+    Returns True, if 5 or more cards share same suit. Jokers are skipped.
 
     :param hand: a list of 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', 'JS'].
     """
 
-    # define suits dict
-    suits = {suit: 0 for suit in ["C", "S", "H", "D"]}
-
-    # count suits in hand
-    for card in hand:
-        if card[1] not in ['B', 'R']:
-            suits[card[1]] += 1
-
-    return 5 in suits.values()
+    return bool(flush_suit(CARD_CODES[card] for card in hand if card[0] != "?"))
 
 
 def straight(ranks: list) -> bool:
@@ -130,71 +360,41 @@ def straight(ranks: list) -> bool:
     Возвращает True, если отсортированные ранги формируют последовательность 5ти,
     где у 5ти карт ранги идут по порядку (стрит)
 
-    Returns True if sorted ranks make up an increasing sequence of 5 cards, where ranks differ by 1.
+    Returns True if ranks make up a sequence of 5 cards, where ranks differ by 1. Ace may start a straight too.
 
     :param ranks: list of ranks, like [10, 10, 8, 6, 5, 1, 1].
     """
 
-    diffs = [abs(ranks[n] - ranks[n - 1])
-             for n
-             in range(1, len(ranks))]
-    n = 0
-
-    for diff in diffs:
-        if diff == 1:
-            n += 1
-            if n == 4:
-                break
-        else:
-            n = 0
-
-    return n == 4
+    return STRAIGHT_HIGHS[rank_bits(ranks)] >= 0
 
 
 def kind(n: int, ranks: list) -> int or None:
     """
-    Возвращает первый ранг, который n раз встречается в данной руке.
+    Возвращает наибольший ранг, который n раз встречается в данной руке.
     Возвращает None, если ничего не найдено
 
-    Returns first encountered rank, for which there are n cards in a hand.
+    Returns the highest rank, for which there are n cards in a hand.
     Returns None, if no groups of a kind in a hand.
 
     :param n: number of rank repetions;
     :param ranks: list of ranks, like [10, 10, 8, 6, 5, 1, 1].
     """
 
-    # creates a dict of unique keys with counter at zero
-    rank_set = {rank: 0 for rank in ranks}
-
-    # counts each rank
-    for rank in ranks:
-        rank_set[rank] += 1
-
-    # makes a generator for values, equal to n, runs 1 iteration with None as default value
-    return next((k for k, v in rank_set.items() if v == n), None)
+    counts = rank_histogram(ranks)
+    return next((rank for rank in range(len(counts) - 1, -1, -1) if counts[rank] == n), None)
 
 
 def two_pair(ranks: list) -> list or None:
     """
-    Если есть две пары, то возврщает два соответствующих ранга, иначе возвращает None.
-    Returns two ranks, which have 2 card each, if there are, else returns None.
+    Если есть две пары, то возврщает два старших соответствующих ранга, иначе возвращает None.
+    Returns two highest ranks, which have 2 card each, if there are, else returns None.
 
     :param ranks: List of rankable card ranks, like [10, 10, 8, 6, 5, 1, 1].
     """
 
-    # inits ranks one and two
-    rank_one = None
-    rank_two = None
-
-    # gets rank for the first pair
-    rank_one = kind(2, ranks)
-
-    # if there's one pair, subsets new rank list from original sans rank_one to look for another pair
-    if rank_one:
-        ranks_sans_ranks_one = [rank for rank in ranks if not rank == rank_one]
-        rank_two = kind(2, ranks_sans_ranks_one)
-
-    return [rank_one, rank_two] if all([rank_one, rank_two]) else None
+    counts = rank_histogram(ranks)
+    pairs = [rank for rank in range(len(counts) - 1, -1, -1) if counts[rank] == 2]
+    return pairs[:2] if len(pairs) >= 2 else None
 
 
 def best_hand(hand: list) -> list:
@@ -205,25 +405,65 @@ def best_hand(hand: list) -> list:
     :param hand: a list of 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', 'JS'].
     """
 
-    return max([(possible_hand, hand_rank(possible_hand))
-                for possible_hand in list(permutations(hand, r=5))],
-               key=lambda x: x[1])[0]
+    return decode_hand(max(combinations(encode_hand(hand), 5), key=lambda codes: evaluate5(*codes)))
+
+
+def joker_substitutes(codes: list, joker: str, jokers_number: int) -> list:
+    """
+    Возвращает карты, которые имеет смысл подставить вместо джокера.
+    Returns codes of cards, which a joker may substitute to improve a hand.
+    Suit of a substitute matters only for flushes, so for other hands one card per rank is enough.
+    Ranks are limited to ranks in a hand (kinds), ranks of straights, which jokers may complete,
+    and the highest ranks available to a joker (kickers).
+
+    :param codes: codes of rankable cards in a hand;
+    :param joker: '?B' or '?R';
+    :param jokers_number: number of jokers in a hand.
+    """
+    present = set(codes)
+    needed = 5 - jokers_number
+    hand_mask = rank_mask(codes)
+
+    mask = hand_mask
+    for straight_mask, _ in STRAIGHT_MASKS:
+        if bin(straight_mask & hand_mask).count("1") >= needed:
+            mask |= straight_mask
+
+    substitutes = set()
+    kickers = 0
+    for rank in range(len(RANKS) - 1, -1, -1):
+        code = next((DECK[rank][suit] for suit in JOKER_SUITS[joker] if DECK[rank][suit] not in present), None)
+        if code and (mask >> rank & 1 or kickers < jokers_number):
+            substitutes.add(code)
+            kickers += 1
 
+    # any card of a suit may complete a flush
+    for suit in JOKER_SUITS[joker]:
+        suit_bit = 1 << (12 + suit)
+        if sum(1 for code in codes if code & suit_bit) >= needed:
+            substitutes.update(DECK[rank][suit] for rank in range(len(RANKS)) if DECK[rank][suit] not in present)
 
-def best_wild_hand(hand: list):
+    return sorted(substitutes)
+
+
+def best_wild_hand(hand: list) -> list:
     """
     Возвращает best_hand но с джокерами.
-    Returns best_hand, now including jokers.
+    Returns best_hand, now including jokers. Jokers are replaced with the cards they substitute.
 
-    :param hand: a list of 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', 'JS'].
+    :param hand: a list of 7 cards, like: ['6C', '7C', '8C', '9C', 'TC', '5C', '?B'].
     """
-    # todo: elaborate the following best wild hand algo
-    # create a list of all possible values a joker could take minus values present in the hand.
-    # do so for red joker separately and for black joker separately
-    # do so for red joker + black joker if at hand.
-    # make all possible permutations, select best hand and substitute the best fitting card/cards with joker/jokers
-    # return best wild hand
-    return list()
+    cards = [card for card in hand if card[0] != "?"]
+    jokers = [card for card in hand if card[0] == "?"]
+    if not jokers:
+        return best_hand(hand)
+
+    codes = encode_hand(cards)
+    best_codes = max((codes + list(substitutes)
+                      for substitutes in product(*(joker_substitutes(codes, joker, len(jokers)) for joker in jokers))
+                      if len(set(substitutes)) == len(substitutes)),
+                     key=evaluate)
+    return best_hand(decode_hand(best_codes))
 
 
 def test_best_hand():
@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from equity import run_batch, simulate
+
+
+class TestEquity(TestCase):
+    def test_run_batch_is_reproducible(self):
+        args = (['AS', 'KS'], ['QS'], 2, 200, 7, 3)
+        self.assertEqual(run_batch(args), run_batch(args))
+        self.assertNotEqual(run_batch(args), run_batch(args[:-1] + (4,)))
+
+    def test_known_board(self):
+        # royal flush can not be beaten
+        result = simulate(['AS', 'KS'], opponents=3, board="QS JS TS 2D 3C".split(), max_trials=500,
+                          batch_size=100, processes=1)
+        self.assertEqual((result.equity, result.win, result.error), (1.0, 1.0, 0.0))
+
+        # board plays for everyone
+        result = simulate(['2C', '3D'], opponents=1, board="AS KS QS JS TS".split(), max_trials=500,
+                          batch_size=100, processes=1)
+        self.assertEqual((result.equity, result.tie), (0.5, 1.0))
+
+    def test_simulate(self):
+        result = simulate(['AS', 'AH'], opponents=1, target_error=0.005, batch_size=2000, processes=1, seed=1)
+        self.assertLessEqual(result.error, 0.005)
+        self.assertAlmostEqual(result.equity, 0.852, delta=0.02)
+        self.assertAlmostEqual(result.win + result.tie + result.loss, 1.0)
+
+    def test_invalid_cards(self):
+        self.assertRaises(ValueError, simulate, ['AS'])
+        self.assertRaises(ValueError, simulate, ['AS', 'AS'])
+        self.assertRaises(ValueError, simulate, ['AS', 'KS'], opponents=30)
@@ -1,5 +1,10 @@
+import random
+from itertools import combinations
 from unittest import TestCase
-from poker import flush, kind, card_ranks, straight, two_pair, best_hand, hand_rank
+
+from poker import flush, kind, card_ranks, straight, two_pair, best_hand, best_wild_hand, hand_rank, rank_hands
+from poker import CARD_CODES, HAND_CLASSES, encode_hand, decode_hand, evaluate, evaluate5, evaluate_hands
+from poker import flush_suit, rank_mask, rank_histogram, STRAIGHT_HIGHS
 
 
 class TestPoker(TestCase):
@@ -24,6 +29,9 @@ class TestPoker(TestCase):
         self.assertFalse(flush("6D 8C 2C KC ?B".split()))
         self.assertFalse(flush("6D 8C 2C KC ?R".split()))
 
+        # 5 or more cards of a suit out of 7
+        self.assertTrue(flush("6C 8C 2C KC QC 3C 4D".split()))
+
     def test_straight(self):
         # 3 straight combinations
         self.assertTrue(straight([10, 9, 4, 3, 2, 1, 0]))
@@ -35,6 +43,10 @@ class TestPoker(TestCase):
         self.assertFalse(straight([9, 8, 7, 6, 3, 2, 1]))
         self.assertFalse(straight([9, 8, 6, 5, 2, 1, 0]))
 
+        # wheel and paired ranks
+        self.assertTrue(straight([12, 8, 3, 2, 1, 0]))
+        self.assertTrue(straight([10, 10, 9, 8, 7, 6, 6]))
+
     def test_kind(self):
         # No paired ranks
         self.assertIsNone(kind(2, [5, 7, 1, 12, 11]))
@@ -55,6 +67,9 @@ class TestPoker(TestCase):
         # returned rank is one of the 3 single cards
         self.assertTrue(kind(1, [5, 3, 2, 2, 11]) in [3, 5, 11])
 
+        # twos are ranked 0
+        self.assertEqual(kind(4, [0, 0, 0, 0, 5]), 0)
+
     def test_two_pair(self):
         # [10, 8]
         self.assertEqual(two_pair([10, 10, 8, 8, 5, 2, 1]), [10, 8])
@@ -70,8 +85,66 @@ class TestPoker(TestCase):
         self.assertEqual(len(two_pair([10, 10, 8, 6, 6, 1, 1])), 2)
         # len(2)
         self.assertEqual(len(two_pair([10, 10, 8, 1, 1, 6, 6])), 2)
+        # [1, 0]
+        self.assertEqual(two_pair([8, 1, 1, 0, 0]), [1, 0])
 
     def test_best_hand(self):
         self.assertEqual(sorted(best_hand("6C 7C 8C 9C TC 5C JS".split())), ['6C', '7C', '8C', '9C', 'TC'])
         self.assertEqual(sorted(best_hand("TD TC TH 7C 7D 8C 8S".split())), ['8C', '8S', 'TC', 'TD', 'TH'])
         self.assertEqual(sorted(best_hand("JD TC TH 7C 7D 7S 7H".split())), ['7C', '7D', '7H', '7S', 'JD'])
+
+    def test_best_wild_hand(self):
+        self.assertEqual(sorted(best_wild_hand("6C 7C 8C 9C TC 5C ?B".split())), ['7C', '8C', '9C', 'JC', 'TC'])
+        self.assertEqual(sorted(best_wild_hand("TD TC 5H 5C 7C ?R ?B".split())), ['7C', 'TC', 'TD', 'TH', 'TS'])
+        self.assertEqual(sorted(best_wild_hand("JD TC TH 7C 7D 7S 7H".split())), ['7C', '7D', '7H', '7S', 'JD'])
+        # joker does not substitute a card, which is already in a hand
+        self.assertEqual(sorted(best_wild_hand("AC AS AD 4H 8C ?B ?R".split())), ['AC', 'AD', 'AH', 'AS', 'KC'])
+
+    def test_best_hand_wheel(self):
+        self.assertEqual(sorted(best_hand("AS 2D 3C 4H 5S 9D KC".split())), ['2D', '3C', '4H', '5S', 'AS'])
+        self.assertEqual(sorted(best_hand("AS 2D 3C 4H 5S 6D KC".split())), ['2D', '3C', '4H', '5S', '6D'])
+
+    def test_hand_rank(self):
+        # wheel is the lowest straight
+        self.assertEqual(hand_rank("AS 2D 3C 4H 5S".split()), (4, 3))
+        self.assertEqual(hand_rank("AS 2S 3S 4S 5S".split()), (8, 3))
+        # quads and full house of twos
+        self.assertEqual(hand_rank("2S 2D 2C 2H 5S".split()), (7, 0, 3))
+        self.assertEqual(hand_rank("2S 2D 2C 5H 5S".split()), (6, 0, 3))
+        # best 5 cards out of 7
+        self.assertEqual(hand_rank("TD TC TH 7C 7D 8C 8S".split()), (6, 8, 6))
+
+    def test_hand_classes(self):
+        self.assertEqual(len(HAND_CLASSES), 7462)
+        self.assertEqual(HAND_CLASSES, sorted(HAND_CLASSES))
+        # ranks are shared by all hands of a class, so they are immutable
+        self.assertEqual(len(set(HAND_CLASSES)), 7462)
+        self.assertEqual(hand_rank("AS KD 9C 7H 2S".split()), (0, (12, 11, 7, 5, 0)))
+        self.assertEqual(hand_rank("AS AD 9C 9H 2S".split()), (2, (12, 7), (12, 12, 7, 7, 0)))
+
+    def test_encode_hand(self):
+        hand = "6C 7D 8H 9S AC".split()
+        self.assertEqual(decode_hand(encode_hand(hand)), hand)
+
+    def test_evaluate(self):
+        rnd = random.Random(0)
+        deck = list(CARD_CODES.values())
+        for _ in range(1000):
+            for size in (6, 7):
+                codes = rnd.sample(deck, size)
+                self.assertEqual(evaluate(codes), max(evaluate5(*hand) for hand in combinations(codes, 5)))
+
+    def test_batch_api(self):
+        hands = ["AS 2D 3C 4H 5S".split(), "TD TC TH 7C 7D 8C 8S".split(), "6C 7C 8C 9C TC".split()]
+        self.assertEqual(rank_hands(hands), [hand_rank(hand) for hand in hands])
+        self.assertEqual(evaluate_hands(encode_hand(hand) for hand in hands),
+                         [evaluate(encode_hand(hand)) for hand in hands])
+
+    def test_bitwise_features(self):
+        codes = encode_hand("AS 2D 3C 4H 5S 5D 9S".split())
+        self.assertEqual(rank_mask(codes), 0b1000010001111)
+        self.assertEqual(STRAIGHT_HIGHS[rank_mask(codes)], 3)
+        self.assertEqual(STRAIGHT_HIGHS[rank_mask(encode_hand("AS 2D 3C 4H 6S".split()))], -1)
+        self.assertEqual(flush_suit(codes), 0)
+        self.assertEqual(flush_suit(encode_hand("AS 2S 3S 4H 5S 6S".split())), CARD_CODES['AS'] & 0xF000)
+        self.assertEqual(rank_histogram([3, 3, 0]), [1, 0, 0, 2] + [0] * 9)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares alignment of all sources by day numbers (data.load_aligned) with the notebook approach:
+every file is read with parsed dates, resampled daily with forward fill and joined by pd.concat(axis=1).
+Both frames are checked to be equal, exits with status 1 on a mismatch.
+
+Run from the project directory:
+
+    python benchmarks/bench_align.py --repeat 20
+"""
+import os
+import sys
+from optparse import OptionParser
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import numpy as np
+import pandas as pd
+
+import data
+import nvt
+
+
+def read_frames(data_dir: str) -> list:
+    return [nvt.read_series_csv(os.path.join(data_dir, file_name), columns, 'infer' if header else None)
+            for file_name, columns, header in data.ALIGNED_FILES]
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    return pd.concat([frame.resample('1D').ffill() for frame in frames], axis=1).rename_axis('date')
+
+
+def read_parts(data_dir: str) -> list:
+    return [data.read_days_csv(os.path.join(data_dir, file_name), columns, header)
+            for file_name, columns, header in data.ALIGNED_FILES]
+
+
+def align_parts(parts: list) -> pd.DataFrame:
+    days, values = data.align(parts)
+    columns = [column for _, file_columns, _ in data.ALIGNED_FILES for column in file_columns]
+    return pd.DataFrame(values, index=data.days_index(days), columns=columns)
+
+
+def best_time(func, repeat_number: int) -> float:
+    return min(repeat(func, number=1, repeat=repeat_number))
+
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("-r", "--repeat", action="store", type=int, default=20)
+    op.add_option("-d", "--data-dir", action="store", default=nvt.DATA_DIR)
+    (opts, args) = op.parse_args()
+
+    frames, parts = read_frames(opts.data_dir), read_parts(opts.data_dir)
+    expected, aligned = concat_frames(frames), align_parts(parts)
+    ok = expected.index.equals(aligned.index) and np.array_equal(expected.to_numpy(), aligned.to_numpy(),
+                                                                 equal_nan=True)
+    print(f'{aligned.shape[0]} days, {aligned.shape[1]} columns, {"equal" if ok else "MISMATCH"}')
+
+    timings = (
+        ('read: parse_dates', lambda: read_frames(opts.data_dir)),
+        ('read: day numbers', lambda: read_parts(opts.data_dir)),
+        ('align: resample + pd.concat', lambda: concat_frames(frames)),
+        ('align: array indexing', lambda: align_parts(parts)),
+        ('total: pd.concat', lambda: concat_frames(read_frames(opts.data_dir))),
+        ('total: data.load_aligned', lambda: data.load_aligned(opts.data_dir)),
+    )
+    for name, func in timings:
+        print(f'  {name:<30}{best_time(func, opts.repeat) * 1e3:10.2f} ms')
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Headless batch rendering of NVT charts.
+
+Charts of the notebook (make_single_ts_plot and make_double_axis_ts_plot) are drawn on explicit Figure objects
+with the Agg canvas, so no pyplot state or rcParams are touched and charts can be rendered in worker processes.
+A chart is described by a dict of column names, so that only descriptions are sent to workers, while data frames
+are passed to each worker once. Series longer than a limit of points are decimated before plotting.
+PNG files are written without a software version in metadata, so a report is the same on every run:
+
+    python charts.py --output report
+"""
+import os
+import time
+from multiprocessing import Pool
+from optparse import OptionParser
+
+import matplotlib.dates as mdates
+import matplotlib.ticker as ticker
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+import nvt
+
+START = '2013-06-01'
+END = '2018-01-31'
+SIZE = (15, 9)
+DPI = 100
+# points per series, one per pixel of a chart width: the minimum and the maximum of a bucket take less than two
+# pixel columns of a plot area, so local extremes stay visible
+MAX_POINTS = SIZE[0] * DPI
+PRICE_COLUMNS = {'blockchain_info': 'usd_price', 'coinmetrics': 'price'}
+SOURCE_TITLES = {'blockchain_info': 'blockchain.info', 'coinmetrics': 'coinmetrics.io'}
+# NVT ranges of the article and of its figure of coinmetrics.io data
+NVT_BREAKS = {
+    'blockchain_info': [{'y0': 0, 'height': 80, 'color': 'green'},
+                        {'y0': 80, 'height': 35, 'color': 'yellow'},
+                        {'y0': 115, 'height': 90, 'color': 'red'}],
+    'coinmetrics': [{'y0': 0, 'height': 20, 'color': 'green'},
+                    {'y0': 20, 'height': 8, 'color': 'yellow'},
+                    {'y0': 28, 'height': 33, 'color': 'red'}],
+}
+
+# data frames and settings of a worker process, see init_worker
+_worker_data = {}
+
+
+def decimate(x: np.ndarray, y: np.ndarray, max_points: int = MAX_POINTS) -> tuple:
+    """
+    Reduces a series to at most about max_points points, keeping the first and the last point, and the minimum
+    and the maximum of each of max_points / 2 equal buckets in their order, so that a line looks the same.
+
+    :return: x and y of kept points.
+    """
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return x, y
+    size = -(-n // (max_points // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    # NaNs of a bucket are never chosen, unless all its values are NaN
+    offsets = np.arange(buckets) * size
+    lowest = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1) + offsets
+    highest = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1) + offsets
+    kept = np.unique(np.concatenate(([0, n - 1], lowest, highest)))
+    kept = kept[kept < n]
+    return x[kept], y[kept]
+
+
+def format_date_axis(axis_obj):
+    axis_obj.xaxis.set_major_locator(mdates.MonthLocator(interval=6))
+    axis_obj.xaxis.set_major_formatter(mdates.DateFormatter('%b-%y'))
+
+
+def format_price_axis(axis_obj, log_scale: bool):
+    if log_scale:
+        axis_obj.set_yscale('log')
+    axis_obj.yaxis.set_major_formatter(ticker.StrMethodFormatter('{x:,.0f}'))
+
+
+def add_nvt_ranges(axis_obj, breaks: list, x0: float, width: float):
+    for br in breaks:
+        axis_obj.add_patch(Rectangle((x0, br['y0']), width, br['height'], color=br['color'], alpha=0.15))
+
+
+def new_figure(size=SIZE) -> Figure:
+    figure = Figure(figsize=size, dpi=DPI)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def single_ts_figure(dates: np.ndarray, series: list, title: str, ylabel: str, size=SIZE, y_log_scale: bool = False,
+                     max_points: int = MAX_POINTS) -> Figure:
+    """
+    make_single_ts_plot of the notebook, which can plot several series on one axis.
+
+    :param dates: datetime64 array;
+    :param series: list of (values, legend label or None);
+    """
+    figure = new_figure(size)
+    ax = figure.add_subplot()
+    for values, label in series:
+        ax.plot(*decimate(dates, values, max_points), lw=0.75, label=label)
+    format_date_axis(ax)
+    format_price_axis(ax, y_log_scale)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    if any(label for _, label in series):
+        ax.legend(loc='upper left').get_frame().set_linewidth(0.0)
+    figure.tight_layout()
+    return figure
+
+
+def double_axis_ts_figure(dates: np.ndarray, ts_1: np.ndarray, ts_1_legend_label: str, ts_1_ylabel: str,
+                          ts_1_lt: str, ts_1_lw: float, ts_1_ylogscale: bool, ts_2: np.ndarray, ts_2_lt: str,
+                          ts_2_lw: float, ts_2_legend_label: str, ts_2_ylabel: str, title: str, size=SIZE,
+                          ts_2_breaks: list = None, max_points: int = MAX_POINTS) -> Figure:
+    """
+    make_double_axis_ts_plot of the notebook, ts_2_breaks are NVT ranges of add_nvt_ranges behind ts_2.
+    """
+    figure = new_figure(size)
+    ax1 = figure.add_subplot()
+    ax1.plot(*decimate(dates, ts_1, max_points), ts_1_lt, lw=ts_1_lw, label=ts_1_legend_label)
+    ax1.set_ylabel(ts_1_ylabel)
+    format_date_axis(ax1)
+    format_price_axis(ax1, ts_1_ylogscale)
+
+    ax2 = ax1.twinx()
+    if ts_2_breaks:
+        x0, x1 = mdates.date2num(dates[0]), mdates.date2num(dates[-1])
+        add_nvt_ranges(ax2, ts_2_breaks, x0, x1 - x0 + 1)
+    ax2.plot(*decimate(dates, ts_2, max_points), ts_2_lt, lw=ts_2_lw, label=ts_2_legend_label)
+    ax2.set_ylabel(ts_2_ylabel)
+
+    ax1.set_title(title)
+    ax1.legend(loc=4, bbox_to_anchor=(0.85, 0)).get_frame().set_linewidth(0.0)
+    ax2.legend(loc=4, bbox_to_anchor=(0.95, 0)).get_frame().set_linewidth(0.0)
+    figure.tight_layout()
+    return figure
+
+
+def report_charts(sources=tuple(nvt.SOURCES), start: str = START, end: str = END) -> list:
+    """
+    Charts of the notebook for each source: market capitalization, transaction volume, NVT new,
+    NVT new and NVT classic, and price vs. NVT new with and without NVT ranges.
+
+    :return: list of chart dicts: file name, kind ('single' or 'double'), source, period and arguments
+        of single_ts_figure or double_axis_ts_figure, where series are column names of a source frame.
+    """
+    charts = []
+    for source in sources:
+        market_cap, tx_volume = nvt.SOURCES[source]
+        name = SOURCE_TITLES[source]
+        charts += [
+            dict(file=f'{source}_market_cap.png', kind='single', source=source, start=None, end=None,
+                 series=[(market_cap, None)], title=f'Market Capitalization ({name})',
+                 ylabel='Market capitalization, USD'),
+            dict(file=f'{source}_tx_volume.png', kind='single', source=source, start=None, end=None,
+                 series=[(tx_volume, None)], title=f'Estimated USD Transaction Value ({name})',
+                 ylabel='Transaction Value, USD'),
+            dict(file=f'{source}_nvt_new.png', kind='single', source=source, start=start, end=end,
+                 series=[('NVTnew', None)], title=f'NVT new ({name})', ylabel='Network Value to Transactions'),
+            dict(file=f'{source}_nvt_new_classic.png', kind='single', source=source, start=start, end=end,
+                 series=[('NVTnew', 'NVT_new'), ('NVT_classic', 'NVT_classic')],
+                 title=f'NVT new vs. NVT classic ({name})', ylabel='Network Value to Transactions'),
+        ]
+        for suffix, breaks in (('', None), ('_ranges', NVT_BREAKS[source])):
+            charts.append(dict(file=f'{source}_price_nvt{suffix}.png', kind='double', source=source, start=start,
+                               end=end, ts_1=PRICE_COLUMNS[source], ts_1_legend_label='USD Price (left log axis)',
+                               ts_1_ylabel='Price, USD', ts_1_lt='r-', ts_1_lw=0.75, ts_1_ylogscale=True,
+                               ts_2='NVTnew', ts_2_legend_label='NVT_new', ts_2_lt='k--', ts_2_lw=0.5,
+                               ts_2_ylabel='Network Value to Transactions', ts_2_breaks=breaks,
+                               title=f'NVT Ratio vs. BTC Price ({name})'))
+    return charts
+
+
+def source_frame(frame: pd.DataFrame, source: str) -> pd.DataFrame:
+    """
+    Data of a source with NVT indicators.
+    """
+    return pd.concat([frame, nvt.compute_indicators(frame, *nvt.SOURCES[source])], axis=1)
+
+
+def init_worker(frames: dict, output_dir: str, max_points: int):
+    _worker_data.update(frames=frames, output_dir=output_dir, max_points=max_points)
+
+
+def render_chart(chart: dict) -> str:
+    """
+    Renders a chart of report_charts on data of a worker process into a PNG file.
+
+    :return: path of a file.
+    """
+    data = _worker_data
+    frame = data['frames'][chart['source']]
+    frame = frame.loc[chart['start']:chart['end']]
+    dates = frame.index.values
+    arguments = {key: value for key, value in chart.items() if key not in ('file', 'kind', 'source', 'start', 'end')}
+    if chart['kind'] == 'single':
+        arguments['series'] = [(frame[column].to_numpy(dtype=np.float64), label)
+                               for column, label in chart['series']]
+        figure = single_ts_figure(dates, max_points=data['max_points'], **arguments)
+    else:
+        arguments['ts_1'] = frame[chart['ts_1']].to_numpy(dtype=np.float64)
+        arguments['ts_2'] = frame[chart['ts_2']].to_numpy(dtype=np.float64)
+        figure = double_axis_ts_figure(dates, max_points=data['max_points'], **arguments)
+
+    path = os.path.join(data['output_dir'], chart['file'])
+    figure.savefig(path, dpi=DPI, metadata={'Software': None})
+    return path
+
+
+def render(charts: list, frames: dict, output_dir: str, processes: int = None,
+           max_points: int = MAX_POINTS) -> list:
+    """
+    Renders charts into PNG files in parallel.
+
+    :param charts: chart dicts, see report_charts;
+    :param frames: data frames of sources with NVT indicators, see source_frame;
+    :param output_dir: directory of PNG files;
+    :param processes: size of a process pool, defaults to a number of CPUs, but not more than a number of charts,
+        1 to render in this process;
+    :param max_points: points per series after decimation;
+    :return: paths of files in the order of charts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shared = (frames, output_dir, max_points)
+    if processes is None:
+        processes = max(min(os.cpu_count() or 1, len(charts)), 1)
+    if processes == 1:
+        init_worker(*shared)
+        return [render_chart(chart) for chart in charts]
+    with Pool(processes, initializer=init_worker, initargs=shared) as pool:
+        return pool.map(render_chart, charts, chunksize=1)
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-s", "--sources", action="store", default=",".join(nvt.SOURCES),
+                  help="comma separated sources: blockchain_info, coinmetrics")
+    op.add_option("-o", "--output", action="store", default="report", help="directory of PNG files")
+    op.add_option("--start", action="store", default=START)
+    op.add_option("--end", action="store", default=END)
+    op.add_option("-p", "--processes", action="store", type=int, default=None,
+                  help="size of a process pool, defaults to a number of CPUs, 1 to render in this process")
+    op.add_option("-m", "--max-points", action="store", type=int, default=MAX_POINTS,
+                  help="points per series after decimation")
+    (opts, args) = op.parse_args()
+
+    import data as cached_data
+
+    sources = opts.sources.split(',')
+    source_frames = {source: source_frame(cached_data.load(source), source) for source in sources}
+    started = time.perf_counter()
+    paths = render(report_charts(sources, opts.start, opts.end), source_frames, opts.output, opts.processes,
+                   opts.max_points)
+    print(f'{len(paths)} charts in {time.perf_counter() - started:.2f} s')
+    for path in paths:
+        print(path)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cached access to NVT data.
+
+CSV files of a source are parsed once into a cache directory: a NumPy .npy file per column and dates as
+int64 days since epoch, which are loaded memory-mapped, so repeated runs do not parse CSV and work offline.
+A cache is rebuilt, when CSV files change.
+
+All sources, including two day estimated-transaction-volume-usd.csv without a header, can be aligned by day
+into one wide float64 frame (source 'aligned'), see align.
+
+Data can be refreshed from blockchain.info charts API and coinmetrics.io, or from a fixture server,
+which serves the same paths, e.g. files written by write_fixtures and served by python -m http.server:
+
+    python data.py --fixtures fixtures
+    (cd fixtures && python -m http.server 8000) &
+    python data.py --refresh --source blockchain_info --blockchain-info-url http://localhost:8000
+"""
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from optparse import OptionParser
+from typing import Optional
+from urllib.request import urlopen
+
+import numpy as np
+import pandas as pd
+
+import nvt
+
+CACHE_DIR = os.path.join(nvt.DATA_DIR, '.cache')
+CACHE_VERSION = 1
+BLOCKCHAIN_INFO_URL = 'https://api.blockchain.info'
+COINMETRICS_URL = 'https://coinmetrics.io'
+# blockchain.info charts of columns
+BLOCKCHAIN_INFO_CHARTS = {
+    'market_cap': 'market-cap',
+    'tx_volume': 'estimated-transaction-volume-usd',
+    'usd_price': 'market-price',
+}
+COINMETRICS_PATH = '/data/btc.csv'
+REQUEST_TIMEOUT = 30
+
+ALIGNED = 'aligned'
+ESTIMATED_TX_VOLUME_FILE = 'estimated-transaction-volume-usd.csv'
+# files of an aligned frame: file name, columns and whether a file has a header
+ALIGNED_FILES = [(file_name, [column], True) for column, file_name in nvt.BLOCKCHAIN_INFO_FILES.items()] + [
+    (ESTIMATED_TX_VOLUME_FILE, ['estimated_tx_volume'], False),
+    (nvt.COINMETRICS_FILE, nvt.COINMETRICS_COLUMNS, True),
+]
+
+
+def source_files(source: str, data_dir: str = nvt.DATA_DIR) -> list:
+    if source == ALIGNED:
+        return [os.path.join(data_dir, file_name) for file_name, _, _ in ALIGNED_FILES]
+    if source == 'blockchain_info':
+        return [os.path.join(data_dir, file_name) for file_name in nvt.BLOCKCHAIN_INFO_FILES.values()]
+    return [os.path.join(data_dir, nvt.COINMETRICS_FILE)]
+
+
+def files_signature(paths: list) -> list:
+    """
+    Sizes and modification times of files, which a cache was built from.
+    """
+    return [[os.path.basename(path), os.path.getsize(path), os.path.getmtime(path)] for path in paths]
+
+
+def save_cache(frame: pd.DataFrame, path: str, meta: dict):
+    """
+    Saves a data frame indexed by date as a directory of .npy files.
+    A directory is written next to a cache and renamed, so that readers never see a partial cache.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    days = frame.index.values.astype('datetime64[D]').astype(np.int64)
+    np.save(os.path.join(tmp_path, 'days.npy'), days)
+    for number, column in enumerate(frame.columns):
+        np.save(os.path.join(tmp_path, f'{number}.npy'), frame[column].to_numpy(dtype=np.float64))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(dict(meta, version=CACHE_VERSION, columns=list(frame.columns)), f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def read_meta(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def load_arrays(path: str) -> tuple:
+    """
+    Loads a cache memory-mapped.
+
+    :return: int64 days since epoch and dict of read-only float64 columns.
+    """
+    meta = read_meta(path)
+    days = np.load(os.path.join(path, 'days.npy'), mmap_mode='r')
+    columns = {column: np.load(os.path.join(path, f'{number}.npy'), mmap_mode='r')
+               for number, column in enumerate(meta['columns'])}
+    return days, columns
+
+
+def days_index(days: np.ndarray) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(np.asarray(days).astype('datetime64[D]').astype('datetime64[ns]'), name='date')
+
+
+def arrays_to_frame(days: np.ndarray, columns: dict) -> pd.DataFrame:
+    return pd.DataFrame(columns, index=days_index(days))
+
+
+def read_days_csv(path: str, columns: list, header: bool = True) -> tuple:
+    """
+    Reads a CSV file with a date or a timestamp in the first column.
+
+    :return: int64 days since epoch and float64 array of shape (days, columns).
+    """
+    frame = pd.read_csv(path, header=0 if header else None, names=['date'] + columns,
+                        dtype=dict({column: np.float64 for column in columns}, date=str))
+    # the first 10 characters of '2009-01-03' and '2009-01-03 00:00:00' are a day
+    days = frame['date'].to_numpy(dtype='U10').astype('datetime64[D]').astype(np.int64)
+    return days, frame[columns].to_numpy(dtype=np.float64)
+
+
+def align(parts: list, ffill: bool = True) -> tuple:
+    """
+    Aligns series of different dates into one array by day numbers: values of a part are written to rows
+    of their days, counted from the first day of all parts.
+
+    Gap policy: with ffill days missing inside a date range of a part (e.g. every other day of two day data)
+    take values of the previous day of the part, like resample('1D').ffill(). Days before the first
+    and after the last day of a part are NaN, as in an outer join.
+
+    :param parts: list of (int64 days, float64 values of shape (days, columns)) with sorted unique days;
+    :param ffill: forward fill missing days;
+    :return: int64 days of the whole range and float64 array of shape (days, columns of all parts).
+    """
+    first = min(days[0] for days, _ in parts)
+    last = max(days[-1] for days, _ in parts)
+    n = last - first + 1
+    result = np.full((n, sum(values.shape[1] for _, values in parts)), np.nan)
+    rows = np.arange(n)
+    column = 0
+    for days, values in parts:
+        positions = days - first
+        columns = slice(column, column + values.shape[1])
+        column = columns.stop
+        if not ffill:
+            result[positions, columns] = values
+            continue
+        # for each day of a part's range - the last row of a part up to it
+        present = np.zeros(n, dtype=bool)
+        present[positions] = True
+        latest = np.maximum.accumulate(np.where(present, np.cumsum(present) - 1, -1))
+        span = slice(positions[0], positions[-1] + 1)
+        result[span, columns] = values[latest[span]]
+    return np.arange(first, last + 1, dtype=np.int64), result
+
+
+def load_aligned(data_dir: str = nvt.DATA_DIR, ffill: bool = True) -> pd.DataFrame:
+    """
+    Loads all sources into one frame of float64 columns indexed by every day of their range, see align.
+
+    :return: data frame with market_cap, tx_volume, usd_price, estimated_tx_volume and COINMETRICS_COLUMNS.
+    """
+    parts = [read_days_csv(os.path.join(data_dir, file_name), columns, header)
+             for file_name, columns, header in ALIGNED_FILES]
+    days, values = align(parts, ffill)
+    columns = [column for _, file_columns, _ in ALIGNED_FILES for column in file_columns]
+    return pd.DataFrame(values, index=days_index(days), columns=columns)
+
+
+LOADERS = {'blockchain_info': nvt.load_blockchain_info, 'coinmetrics': nvt.load_coinmetrics, ALIGNED: load_aligned}
+
+
+def cache_path(source: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, source)
+
+
+def load(source: str, cache_dir: str = CACHE_DIR, data_dir: str = nvt.DATA_DIR) -> pd.DataFrame:
+    """
+    Loads data of a source from a cache. Parses CSV files of a source into a cache,
+    if there is no cache or CSV files have changed since it was built.
+    A refreshed cache is used, until CSV files change, then it is rebuilt from them.
+
+    :param source: 'blockchain_info', 'coinmetrics' or 'aligned';
+    :return: data frame of float64 columns indexed by date, like nvt.load_source or load_aligned.
+    """
+    path = cache_path(source, cache_dir)
+    signature = files_signature(source_files(source, data_dir))
+    meta = read_meta(path)
+    if meta is None or meta.get('files') != signature:
+        save_cache(LOADERS[source](data_dir), path, {'files': signature})
+    return arrays_to_frame(*load_arrays(path))
+
+
+def fetch(url: str) -> bytes:
+    with urlopen(url, timeout=REQUEST_TIMEOUT) as response:
+        return response.read()
+
+
+def parse_chart(payload: bytes, column: str) -> pd.Series:
+    """
+    Parses blockchain.info chart JSON, like {"values": [{"x": 1231027200, "y": 0.0}, ...]},
+    into a daily series, forward filling missing days.
+    """
+    values = json.loads(payload)['values']
+    series = pd.Series([float(value['y']) for value in values],
+                       index=pd.to_datetime([value['x'] for value in values], unit='s').normalize(),
+                       name=column, dtype=np.float64)
+    return series[~series.index.duplicated(keep='last')].resample('1D').ffill()
+
+
+def download(source: str, blockchain_info_url: str = BLOCKCHAIN_INFO_URL,
+             coinmetrics_url: str = COINMETRICS_URL) -> pd.DataFrame:
+    """
+    Downloads data of a source.
+    """
+    if source not in nvt.SOURCES:
+        raise ValueError(f'Source {source} can not be downloaded.')
+    if source == 'blockchain_info':
+        series = [parse_chart(fetch(f'{blockchain_info_url}/charts/{chart}?timespan=all&format=json'), column)
+                  for column, chart in BLOCKCHAIN_INFO_CHARTS.items()]
+        return pd.concat(series, axis=1).rename_axis('date').ffill()
+
+    frame = pd.read_csv(BytesIO(fetch(coinmetrics_url + COINMETRICS_PATH)), header=None, skiprows=1,
+                        names=['date'] + nvt.COINMETRICS_COLUMNS, index_col=0, parse_dates=[0],
+                        dtype={column: np.float64 for column in nvt.COINMETRICS_COLUMNS})
+    return frame
+
+
+def refresh(source: str, cache_dir: str = CACHE_DIR, data_dir: str = nvt.DATA_DIR, **urls) -> pd.DataFrame:
+    """
+    Downloads data of a source into a cache.
+
+    :param urls: blockchain_info_url and coinmetrics_url, e.g. of a fixture server.
+    """
+    frame = download(source, **urls)
+    save_cache(frame, cache_path(source, cache_dir),
+               {'files': files_signature(source_files(source, data_dir)), 'refreshed': True})
+    return load(source, cache_dir, data_dir)
+
+
+def write_fixtures(fixture_dir: str, data_dir: str = nvt.DATA_DIR):
+    """
+    Writes bundled data in formats of blockchain.info charts API and coinmetrics.io to a directory,
+    which can be served by python -m http.server as a fixture server.
+    """
+    os.makedirs(os.path.join(fixture_dir, 'charts'), exist_ok=True)
+    os.makedirs(os.path.join(fixture_dir, 'data'), exist_ok=True)
+
+    blockchain_info = nvt.load_blockchain_info(data_dir)
+    seconds = blockchain_info.index.values.astype('datetime64[s]').astype(np.int64)
+    for column, chart in BLOCKCHAIN_INFO_CHARTS.items():
+        values = [{'x': int(x), 'y': float(y)} for x, y in zip(seconds, blockchain_info[column])]
+        with open(os.path.join(fixture_dir, 'charts', chart), 'w') as f:
+            json.dump({'name': chart, 'unit': 'USD', 'period': 'day', 'values': values}, f)
+
+    shutil.copy(os.path.join(data_dir, nvt.COINMETRICS_FILE), os.path.join(fixture_dir, COINMETRICS_PATH.lstrip('/')))
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-s", "--source", action="store", default="blockchain_info", help="blockchain_info, coinmetrics or aligned")
+    op.add_option("--cache-dir", action="store", default=CACHE_DIR)
+    op.add_option("-r", "--refresh", action="store_true", default=False, help="download data into a cache")
+    op.add_option("--blockchain-info-url", action="store", default=BLOCKCHAIN_INFO_URL)
+    op.add_option("--coinmetrics-url", action="store", default=COINMETRICS_URL)
+    op.add_option("-f", "--fixtures", action="store", default=None, help="write fixtures of a fixture server")
+    op.add_option("-c", "--clear", action="store_true", default=False, help="remove a cache")
+    (opts, args) = op.parse_args()
+
+    if opts.fixtures:
+        write_fixtures(opts.fixtures)
+    elif opts.clear:
+        shutil.rmtree(cache_path(opts.source, opts.cache_dir), ignore_errors=True)
+    else:
+        if opts.refresh:
+            data = refresh(opts.source, opts.cache_dir, blockchain_info_url=opts.blockchain_info_url,
+                           coinmetrics_url=opts.coinmetrics_url)
+        else:
+            data = load(opts.source, opts.cache_dir)
+        print(data.info())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+NVT ratio indicators from the bundled blockchain.info and coinmetrics.io data.
+
+NVT (network value to transactions) is market capitalization divided by daily transaction volume.
+NVT new divides market capitalization by a moving average of transaction volume (90 days in the article),
+NVT classic divides two directional 28 day moving averages of both.
+
+Moving averages of many windows share precomputed power-of-two window sums, so that window parameters
+can be swept quickly:
+
+    python nvt.py --source coinmetrics --ma 30,60,90 --ema 30
+"""
+import os
+from optparse import OptionParser
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+BLOCKCHAIN_INFO_FILES = {
+    'market_cap': 'blockchain_info_market_cap_21-02-2018.csv',
+    'tx_volume': 'blockchain_info_estimated_transaction_value_21-02-2018.csv',
+    'usd_price': 'blockchain_info_usd_price-21-02-2018.csv',
+}
+COINMETRICS_FILE = 'coinmetrics_data_22-02-2018.csv'
+COINMETRICS_COLUMNS = ['txVolume', 'txCount', 'marketcap', 'price', 'exchangeVolume', 'generatedCoins', 'fees']
+
+# market capitalization and transaction volume columns of each source
+SOURCES = {
+    'blockchain_info': ('market_cap', 'tx_volume'),
+    'coinmetrics': ('marketcap', 'txVolume'),
+}
+NVT_NEW_WINDOW = 90
+NVT_CLASSIC_WINDOW = 28
+
+
+def read_series_csv(path: str, columns: list, header='infer') -> pd.DataFrame:
+    """
+    Reads a CSV file with a date in the first column into float64 columns indexed by date.
+    """
+    return pd.read_csv(path, header=header, names=None if header == 'infer' else ['date'] + columns,
+                       index_col=0, parse_dates=[0], dtype={column: np.float64 for column in columns})
+
+
+def load_blockchain_info(data_dir: str = DATA_DIR) -> pd.DataFrame:
+    """
+    Loads blockchain.info market capitalization, estimated transaction value and price.
+
+    :return: data frame with market_cap, tx_volume and usd_price float64 columns indexed by date.
+    """
+    return pd.concat([read_series_csv(os.path.join(data_dir, file_name), [column])
+                      for column, file_name in BLOCKCHAIN_INFO_FILES.items()], axis=1)
+
+
+def load_coinmetrics(data_dir: str = DATA_DIR) -> pd.DataFrame:
+    """
+    Loads coinmetrics.io data.
+
+    :return: data frame with COINMETRICS_COLUMNS float64 columns indexed by date.
+    """
+    return read_series_csv(os.path.join(data_dir, COINMETRICS_FILE), COINMETRICS_COLUMNS)
+
+
+def load_source(source: str, data_dir: str = DATA_DIR) -> pd.DataFrame:
+    return {'blockchain_info': load_blockchain_info, 'coinmetrics': load_coinmetrics}[source](data_dir)
+
+
+def power_of_two_sums(values: np.ndarray, max_window: int) -> list:
+    """
+    Sums of windows of 1, 2, 4, ... values: k-th array holds sums of values[i:i + 2 ** k] for every i.
+    Each level is a sum of two shifted previous levels, so, unlike differences of a cumulative sum,
+    sums do not lose precision, when values span many orders of magnitude.
+    """
+    levels = [values]
+    size = 1
+    while size * 2 <= max_window:
+        previous = levels[-1]
+        levels.append(previous[:-size] + previous[size:])
+        size *= 2
+    return levels
+
+
+def rolling_means(values: np.ndarray, windows, min_periods: int = 1) -> np.ndarray:
+    """
+    Trailing moving averages of many windows,
+    same as pd.Series(values).rolling(window, min_periods).mean() for values without NaNs.
+    A window sum is a sum of shifted power-of-two window sums by bits of a window size,
+    means of incomplete windows at the start are taken from a cumulative sum.
+
+    :param values: 1-d array;
+    :param windows: iterable of window sizes;
+    :param min_periods: number of values, below which a mean is NaN;
+    :return: array of shape (number of windows, number of values).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    windows = list(windows)
+    n = len(values)
+    means = np.empty((len(windows), n))
+    if not windows or not n:
+        return means
+
+    levels = power_of_two_sums(values, min(max(windows), n))
+    counts = np.arange(1, n + 1)
+    prefix_means = np.cumsum(values) / counts
+
+    for row, window in enumerate(windows):
+        full = min(window, n)
+        means[row, :full - 1] = prefix_means[:full - 1]
+        if window <= n:
+            sums = np.zeros(n - window + 1)
+            offset = 0
+            for level, level_sums in enumerate(levels):
+                if window >> level & 1:
+                    sums += level_sums[offset:offset + n - window + 1]
+                    offset += 1 << level
+            means[row, window - 1:] = sums / window
+        else:
+            means[row, full - 1] = prefix_means[full - 1]
+        means[row, :min_periods - 1] = np.nan
+    return means
+
+
+def ema(values: np.ndarray, spans) -> np.ndarray:
+    """
+    Exponential moving averages of many spans,
+    same as pd.Series(values).ewm(span=span, adjust=False).mean().
+
+    :param values: 1-d array;
+    :param spans: iterable of spans;
+    :return: array of shape (number of spans, number of values).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    alphas = 2.0 / (np.asarray(list(spans), dtype=np.float64) + 1.0)
+    result = np.empty((len(alphas), len(values)))
+    if not len(values):
+        return result
+    # one step per day, all spans at once
+    result[:, 0] = values[0]
+    for i in range(1, len(values)):
+        result[:, i] = result[:, i - 1] + alphas * (values[i] - result[:, i - 1])
+    return result
+
+
+def two_directional_rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean of trailing and leading moving averages of a half of a window, as in the notebook.
+    """
+    assert window % 2 == 0, 'Window must be divisible by 2.'
+    values = np.asarray(values, dtype=np.float64)
+    trailing = rolling_means(values, [window // 2])[0]
+    leading = rolling_means(values[::-1], [window // 2])[0][::-1]
+    return (trailing + leading) / 2
+
+
+def divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Element-wise division, which gives inf or NaN for zero denominators without warnings, like pandas.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return numerator / denominator
+
+
+def compute_indicators(frame: pd.DataFrame, market_cap: str, tx_volume: str, ma_windows=(NVT_NEW_WINDOW,),
+                       ema_spans=(), classic_window: int = NVT_CLASSIC_WINDOW) -> pd.DataFrame:
+    """
+    Computes NVT indicators in one pass.
+
+    :param frame: data frame with market capitalization and transaction volume columns;
+    :param market_cap: name of market capitalization column;
+    :param tx_volume: name of transaction volume column;
+    :param ma_windows: windows of transaction volume moving averages;
+    :param ema_spans: spans of transaction volume exponential moving averages;
+    :param classic_window: window of two directional moving averages of NVT classic, None to skip it;
+    :return: data frame with the same index and columns:
+        NVT, MA{window}_tx_vol and NVTnew_MA{window} for each window, EMA{span}_tx_vol and NVTnew_EMA{span}
+        for each span, NVTnew for a 90 day window, if it was computed, and NVT_classic.
+    """
+    market_cap_values = frame[market_cap].to_numpy(dtype=np.float64)
+    tx_volume_values = frame[tx_volume].to_numpy(dtype=np.float64)
+    columns = {'NVT': divide(market_cap_values, tx_volume_values)}
+
+    ma_windows, ema_spans = list(ma_windows), list(ema_spans)
+    averages = [(f'MA{window}', means) for window, means in zip(ma_windows, rolling_means(tx_volume_values,
+                                                                                          ma_windows))]
+    averages += [(f'EMA{span}', means) for span, means in zip(ema_spans, ema(tx_volume_values, ema_spans))]
+    for name, means in averages:
+        columns[f'{name}_tx_vol'] = means
+        columns[f'NVTnew_{name}'] = divide(market_cap_values, means)
+
+    if NVT_NEW_WINDOW in ma_windows:
+        columns['NVTnew'] = columns[f'NVTnew_MA{NVT_NEW_WINDOW}']
+    if classic_window:
+        columns['NVT_classic'] = divide(two_directional_rolling_mean(market_cap_values, classic_window),
+                                        two_directional_rolling_mean(tx_volume_values, classic_window))
+
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def parse_windows(value: str) -> list:
+    return [int(window) for window in value.split(',') if window]
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-s", "--source", action="store", default="blockchain_info", help="blockchain_info or coinmetrics")
+    op.add_option("--ma", action="store", default=str(NVT_NEW_WINDOW), help="comma separated moving average windows")
+    op.add_option("--ema", action="store", default="", help="comma separated exponential moving average spans")
+    op.add_option("-o", "--output", action="store", default=None, help="CSV file to save indicators")
+    (opts, args) = op.parse_args()
+
+    import data as cached_data
+
+    data = cached_data.load(opts.source)
+    indicators = compute_indicators(data, *SOURCES[opts.source], ma_windows=parse_windows(opts.ma),
+                                    ema_spans=parse_windows(opts.ema))
+    if opts.output:
+        indicators.to_csv(opts.output)
+    else:
+        print(indicators.tail())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parameter sweep of NVT new trading signals.
+
+A signal buys, when NVT new drops below a buy threshold, and sells, when it rises above a sell threshold,
+otherwise a position is kept. A position is taken at a close of a signal day, so it earns a return
+of the next day. Every combination of a moving average window and buy / sell thresholds is scored
+by a backtest on the price series of a source.
+
+Moving averages of all windows of a task are computed at once, signals of all thresholds of a window
+are evaluated at once as arrays of shape (buy thresholds, sell thresholds, days).
+Windows are sharded across a process pool:
+
+    python sweep.py --source coinmetrics --windows 10:365:5 --buy 5:40:1 --sell 20:80:2 --top 20
+"""
+import math
+import time
+from multiprocessing import Pool
+from optparse import OptionParser
+
+import numpy as np
+import pandas as pd
+
+import nvt
+
+START = '2013-06-01'
+END = '2018-01-31'
+DAYS_PER_YEAR = 365
+PRICE_COLUMNS = {'blockchain_info': 'usd_price', 'coinmetrics': 'price'}
+RESULT_COLUMNS = ['window', 'buy', 'sell', 'total_return', 'sharpe', 'max_drawdown', 'trades', 'exposure']
+
+# data shared by tasks of a worker process, see init_worker
+_worker_data = {}
+
+
+def parse_range(value: str, dtype=float) -> np.ndarray:
+    """
+    Parses 'start:stop:step' (stop included) or a comma separated list of values.
+    """
+    if ':' in value:
+        start, stop, step = (dtype(item) for item in value.split(':'))
+        return np.arange(start, stop + step / 2, step, dtype=np.float64)
+    return np.array([dtype(item) for item in value.split(',')], dtype=np.float64)
+
+
+def last_days(condition: np.ndarray) -> np.ndarray:
+    """
+    For each day - the last day up to it, when a condition was true, or -1.
+    """
+    days = np.arange(condition.shape[-1])
+    return np.maximum.accumulate(np.where(condition, days, -1), axis=-1)
+
+
+def positions(signal: np.ndarray, buy: np.ndarray, sell: np.ndarray) -> np.ndarray:
+    """
+    Positions held at a close of each day for all pairs of thresholds.
+    A position is held, when the last buy event is later, than the last sell event.
+
+    :param signal: NVT values of days;
+    :param buy: buy thresholds;
+    :param sell: sell thresholds;
+    :return: bool array of shape (len(buy), len(sell), days).
+    """
+    last_buy = last_days(signal < buy[:, None])
+    last_sell = last_days(signal > sell[:, None])
+    return last_buy[:, None, :] > last_sell[None, :, :]
+
+
+def score(held: np.ndarray, log_returns: np.ndarray) -> dict:
+    """
+    Backtest of positions.
+
+    :param held: bool positions of shape (..., days);
+    :param log_returns: log returns of days, log_returns[t] is a return from day t - 1 to day t;
+    :return: dict of arrays of shape (...): total_return, annualised sharpe, max_drawdown, trades and exposure.
+    """
+    held_before = held[..., :-1]
+    returns = log_returns[1:]
+    days = len(returns)
+    # positions are 0 or 1, so sums of strategy returns and of their squares are dot products
+    total = held_before @ returns
+    mean = total / days
+    variance = np.maximum(held_before @ (returns * returns) / days - mean * mean, 0)
+    std = np.sqrt(variance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * math.sqrt(DAYS_PER_YEAR), 0.0)
+
+    cumulative = np.cumsum(np.where(held_before, returns, 0.0), axis=-1)
+    drawdown = np.max(np.maximum.accumulate(np.maximum(cumulative, 0), axis=-1) - cumulative, axis=-1)
+    return {
+        'total_return': np.expm1(total),
+        'sharpe': sharpe,
+        'max_drawdown': -np.expm1(-drawdown),
+        'trades': np.count_nonzero(held[..., 1:] != held_before, axis=-1),
+        'exposure': held.mean(axis=-1),
+    }
+
+
+def init_worker(market_cap: np.ndarray, tx_volume: np.ndarray, log_returns: np.ndarray, period: slice,
+                buy: np.ndarray, sell: np.ndarray):
+    _worker_data.update(market_cap=market_cap, tx_volume=tx_volume, log_returns=log_returns, period=period,
+                        buy=buy, sell=sell)
+
+
+def evaluate_windows(windows: list) -> pd.DataFrame:
+    """
+    Scores all thresholds of given windows on data of a worker process.
+    """
+    data = _worker_data
+    buy, sell = data['buy'], data['sell']
+    means = nvt.rolling_means(data['tx_volume'], windows)
+    signals = nvt.divide(data['market_cap'], means)[:, data['period']]
+    valid_pairs = buy[:, None] < sell[None, :]
+    buy_grid, sell_grid = np.broadcast_arrays(buy[:, None], sell[None, :])
+
+    frames = []
+    for window, signal in zip(windows, signals):
+        scores = score(positions(signal, buy, sell), data['log_returns'])
+        frame = {'window': window, 'buy': buy_grid[valid_pairs], 'sell': sell_grid[valid_pairs]}
+        frame.update((name, values[valid_pairs]) for name, values in scores.items())
+        frames.append(pd.DataFrame(frame, columns=RESULT_COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+
+def prepare(frame: pd.DataFrame, source: str, start: str = START, end: str = END) -> tuple:
+    """
+    :return: market capitalization, transaction volume, log returns of a period and a slice of a period.
+    """
+    market_cap, tx_volume = nvt.SOURCES[source]
+    index = frame.index
+    period = slice(index.searchsorted(pd.Timestamp(start)), index.searchsorted(pd.Timestamp(end), side='right'))
+    prices = frame[PRICE_COLUMNS[source]].to_numpy(dtype=np.float64)[period]
+    if (prices <= 0).any():
+        raise ValueError('Prices of a period should be positive.')
+    log_returns = np.concatenate(([0.0], np.diff(np.log(prices))))
+    return (frame[market_cap].to_numpy(dtype=np.float64), frame[tx_volume].to_numpy(dtype=np.float64),
+            log_returns, period)
+
+
+def sweep(frame: pd.DataFrame, source: str, windows, buy, sell, start: str = START, end: str = END,
+          processes: int = None, windows_per_task: int = 8) -> pd.DataFrame:
+    """
+    Scores every combination of a moving average window and buy / sell thresholds, where buy < sell.
+
+    :param frame: data of a source, see nvt.load_source;
+    :param source: 'blockchain_info' or 'coinmetrics';
+    :param windows: moving average windows of transaction volume;
+    :param buy: buy thresholds of NVT new;
+    :param sell: sell thresholds of NVT new;
+    :param start: first day of a backtest, moving averages are computed over the whole history;
+    :param end: last day of a backtest;
+    :param processes: size of a process pool, defaults to a number of CPUs, 1 to run in this process;
+    :param windows_per_task: number of windows per task of a pool;
+    :return: data frame of RESULT_COLUMNS sorted by sharpe ratio in a descending order.
+    """
+    shared = prepare(frame, source, start, end) + (np.asarray(buy, dtype=np.float64),
+                                                   np.asarray(sell, dtype=np.float64))
+    windows = [int(window) for window in windows]
+    tasks = [windows[i:i + windows_per_task] for i in range(0, len(windows), windows_per_task)]
+
+    if processes == 1:
+        init_worker(*shared)
+        results = [evaluate_windows(task) for task in tasks]
+    else:
+        with Pool(processes, initializer=init_worker, initargs=shared) as pool:
+            results = pool.map(evaluate_windows, tasks)
+
+    return pd.concat(results, ignore_index=True).sort_values('sharpe', ascending=False, ignore_index=True)
+
+
+def buy_and_hold(frame: pd.DataFrame, source: str, start: str = START, end: str = END) -> dict:
+    log_returns = prepare(frame, source, start, end)[2]
+    return {name: float(value) for name, value in score(np.ones(len(log_returns), dtype=bool),
+                                                        log_returns).items()}
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-s", "--source", action="store", default="coinmetrics", help="blockchain_info or coinmetrics")
+    op.add_option("-w", "--windows", action="store", default="10:365:5", help="start:stop:step or comma separated")
+    op.add_option("-b", "--buy", action="store", default="5:40:1", help="buy thresholds of NVT new")
+    op.add_option("--sell", action="store", default="20:80:2", help="sell thresholds of NVT new")
+    op.add_option("--start", action="store", default=START)
+    op.add_option("--end", action="store", default=END)
+    op.add_option("-p", "--processes", action="store", type=int, default=None)
+    op.add_option("-t", "--top", action="store", type=int, default=20)
+    op.add_option("-o", "--output", action="store", default=None, help="CSV file to save all results")
+    (opts, args) = op.parse_args()
+
+    import data as cached_data
+
+    data = cached_data.load(opts.source)
+    started = time.perf_counter()
+    results = sweep(data, opts.source, parse_range(opts.windows, int), parse_range(opts.buy), parse_range(opts.sell),
+                    start=opts.start, end=opts.end, processes=opts.processes)
+    elapsed = time.perf_counter() - started
+
+    print(f'{len(results)} configurations in {elapsed:.2f} s ({len(results) / elapsed:,.0f} per second)')
+    print('buy and hold:', {name: round(value, 3) for name, value in buy_and_hold(data, opts.source, opts.start,
+                                                                                  opts.end).items()})
+    print(results.head(opts.top).to_string())
+    if opts.output:
+        results.to_csv(opts.output, index=False)
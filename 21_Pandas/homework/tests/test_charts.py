@@ -0,0 +1,57 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import numpy as np
+
+import charts
+import nvt
+
+
+class TestDecimate(TestCase):
+    def test_short_series(self):
+        x, y = np.arange(10), np.arange(10.0)
+        self.assertIs(charts.decimate(x, y, 10)[1], y)
+
+    def test_bucket_extremes(self):
+        random = np.random.default_rng(0)
+        n, max_points = 1003, 100
+        x, y = np.arange(n), random.normal(size=n)
+        y[[5, 500, 501]] = np.nan
+        y[900:910] = np.nan
+        kept_x, kept_y = charts.decimate(x, y, max_points)
+
+        self.assertLessEqual(len(kept_x), max_points + 2)
+        self.assertEqual((kept_x[0], kept_x[-1]), (0, n - 1))
+        self.assertTrue((np.diff(kept_x) > 0).all())
+        np.testing.assert_array_equal(kept_y, y[kept_x])
+        # NaNs are skipped, since no bucket is all NaN
+        self.assertFalse(np.isnan(kept_y).any())
+        size = -(-n // (max_points // 2))
+        for start in range(0, n, size):
+            bucket = y[start:start + size]
+            for extreme in (np.nanmin(bucket), np.nanmax(bucket)):
+                self.assertIn(extreme, kept_y[(kept_x >= start) & (kept_x < start + size)])
+
+
+class TestRender(TestCase):
+    def test_default_processes(self):
+        report = charts.report_charts()
+        for cpus, expected in ((16, len(report)), (4, 4)):
+            with mock.patch('charts.os.cpu_count', return_value=cpus), mock.patch('charts.Pool') as pool, \
+                    tempfile.TemporaryDirectory() as directory:
+                charts.render(report, {}, directory)
+            self.assertEqual(pool.call_args.args[0], expected)
+
+    def test_processes(self):
+        frames = {'coinmetrics': charts.source_frame(nvt.load_coinmetrics(), 'coinmetrics')}
+        report = [chart for chart in charts.report_charts(['coinmetrics'])
+                  if chart['file'] in ('coinmetrics_market_cap.png', 'coinmetrics_price_nvt_ranges.png')]
+        with tempfile.TemporaryDirectory() as directory:
+            serial = charts.render(report, frames, os.path.join(directory, 'serial'), processes=1, max_points=500)
+            parallel = charts.render(report, frames, os.path.join(directory, 'parallel'), processes=2,
+                                     max_points=500)
+            self.assertEqual([os.path.basename(path) for path in parallel], [chart['file'] for chart in report])
+            for serial_path, parallel_path in zip(serial, parallel):
+                with open(serial_path, 'rb') as serial_file, open(parallel_path, 'rb') as parallel_file:
+                    self.assertEqual(serial_file.read(), parallel_file.read())
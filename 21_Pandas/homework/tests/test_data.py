@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+import numpy as np
+import pandas as pd
+
+import data
+import nvt
+
+
+def assert_same_data(loaded: pd.DataFrame, expected: pd.DataFrame):
+    """
+    Compares days, columns and values, since a cache index is datetime64[ns] and a parsed one may not be.
+    """
+    np.testing.assert_array_equal(loaded.index.values.astype('datetime64[D]'),
+                                  expected.index.values.astype('datetime64[D]'))
+    assert list(loaded.columns) == list(expected.columns), (list(loaded.columns), list(expected.columns))
+    np.testing.assert_array_equal(loaded.to_numpy(), expected.to_numpy())
+
+
+class TestCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.directory.name, 'data')
+        self.cache_dir = os.path.join(self.directory.name, 'cache')
+        os.makedirs(self.data_dir)
+        shutil.copy(os.path.join(nvt.DATA_DIR, nvt.COINMETRICS_FILE), self.data_dir)
+        self.csv_path = os.path.join(self.data_dir, nvt.COINMETRICS_FILE)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        frame = pd.DataFrame({'a': [1.0, np.nan, 3.0], 'b': [1e-3, 2e11, -5.0]},
+                             index=pd.DatetimeIndex(['2017-12-31', '2018-01-01', '2018-01-02'], name='date'))
+        path = os.path.join(self.cache_dir, 'frame')
+        data.save_cache(frame, path, {'files': []})
+        assert_same_data(data.arrays_to_frame(*data.load_arrays(path)), frame)
+        self.assertEqual(data.read_meta(path)['columns'], ['a', 'b'])
+        self.assertIsNone(data.read_meta(os.path.join(self.cache_dir, 'missing')))
+
+    def test_load_builds_cache(self):
+        expected = nvt.load_coinmetrics(self.data_dir)
+        loaded = data.load('coinmetrics', self.cache_dir, self.data_dir)
+        assert_same_data(loaded, expected)
+        with mock.patch.object(data, 'LOADERS', {}):
+            # a cache of unchanged files is used without parsing CSV
+            assert_same_data(data.load('coinmetrics', self.cache_dir, self.data_dir), expected)
+
+    def test_refreshed_cache_rebuilt_after_csv_change(self):
+        downloaded = nvt.load_coinmetrics(self.data_dir).iloc[:10] * 2
+        with mock.patch.object(data, 'download', return_value=downloaded):
+            refreshed = data.refresh('coinmetrics', self.cache_dir, self.data_dir)
+        assert_same_data(refreshed, downloaded)
+        assert_same_data(data.load('coinmetrics', self.cache_dir, self.data_dir), downloaded)
+
+        with open(self.csv_path, 'a') as f:
+            f.write('2018-02-23,1.0,1,1.0,1.0,0.0,1.0,1.0\n')
+        loaded = data.load('coinmetrics', self.cache_dir, self.data_dir)
+        assert_same_data(loaded, nvt.load_coinmetrics(self.data_dir))
+        self.assertEqual(loaded.index[-1], pd.Timestamp('2018-02-23'))
+
+
+def days(*dates) -> np.ndarray:
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+class TestAlign(TestCase):
+    def test_two_day_gaps(self):
+        daily = (days('2018-01-01', '2018-01-02', '2018-01-03', '2018-01-04', '2018-01-05'),
+                 np.arange(5, dtype=np.float64).reshape(5, 1))
+        two_day = (days('2018-01-01', '2018-01-03', '2018-01-05'), np.array([[10.0, 20.0], [11.0, 21.0], [12.0, 22.0]]))
+        aligned_days, values = data.align([daily, two_day])
+        np.testing.assert_array_equal(aligned_days, days('2018-01-01', '2018-01-02', '2018-01-03', '2018-01-04',
+                                                         '2018-01-05'))
+        np.testing.assert_array_equal(values, [[0, 10, 20], [1, 10, 20], [2, 11, 21], [3, 11, 21], [4, 12, 22]])
+
+        _, values = data.align([daily, two_day], ffill=False)
+        np.testing.assert_array_equal(values[:, 1], [10, np.nan, 11, np.nan, 12])
+
+    def test_non_overlapping_ranges(self):
+        early = (days('2018-01-01', '2018-01-03'), np.array([[1.0], [3.0]]))
+        late = (days('2018-01-06', '2018-01-07'), np.array([[6.0], [7.0]]))
+        aligned_days, values = data.align([late, early])
+        np.testing.assert_array_equal(aligned_days, days('2018-01-01', '2018-01-02', '2018-01-03', '2018-01-04',
+                                                         '2018-01-05', '2018-01-06', '2018-01-07'))
+        # days outside a range of a part are NaN, days inside it are forward filled
+        np.testing.assert_array_equal(values[:, 0], [np.nan] * 5 + [6, 7])
+        np.testing.assert_array_equal(values[:, 1], [1, 1, 3, np.nan, np.nan, np.nan, np.nan])
+
+    def test_same_as_resample_and_concat(self):
+        random = np.random.default_rng(0)
+        parts, frames = [], []
+        for number in range(3):
+            part_days = np.sort(random.choice(np.arange(17500, 17600), 30, replace=False)).astype(np.int64)
+            values = random.normal(size=(30, 2))
+            parts.append((part_days, values))
+            frames.append(pd.DataFrame(values, index=data.days_index(part_days),
+                                       columns=[f'{number}a', f'{number}b']).resample('1D').ffill())
+        aligned_days, values = data.align(parts)
+        # an outer join, as pd.concat(axis=1, sort=True) may drop rows of daily indexes
+        expected = frames[0].join(frames[1:], how='outer')
+        np.testing.assert_array_equal(data.days_index(aligned_days), expected.index)
+        np.testing.assert_array_equal(values, expected.to_numpy())
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+import nvt
+
+# relative tolerance of comparisons with pandas, whose window sums are computed in another order
+RTOL = 4e-15
+
+
+class TestIndicators(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # transaction volume spans 11 orders of magnitude and has zero days
+        cls.frame = nvt.load_blockchain_info()
+        cls.values = cls.frame['tx_volume'].to_numpy(dtype=np.float64)
+
+    def test_power_of_two_sums(self):
+        values = np.arange(1.0, 12.0)
+        levels = nvt.power_of_two_sums(values, 8)
+        self.assertEqual(len(levels), 4)
+        for level, sums in enumerate(levels):
+            size = 2 ** level
+            np.testing.assert_array_equal(sums, [values[i:i + size].sum() for i in range(len(values) - size + 1)])
+
+    def test_rolling_means(self):
+        windows = [1, 2, 3, 4, 7, 8, 28, 64, 90, 128, 256, 365, 1024, len(self.values), len(self.values) + 5]
+        means = nvt.rolling_means(self.values, windows)
+        self.assertEqual(means.shape, (len(windows), len(self.values)))
+        for window, row in zip(windows, means):
+            expected = pd.Series(self.values).rolling(window, min_periods=1).mean().to_numpy()
+            np.testing.assert_allclose(row, expected, rtol=RTOL, atol=0, err_msg=f'window {window}')
+
+    def test_rolling_means_min_periods(self):
+        means = nvt.rolling_means(self.values[:100], [8, 90], min_periods=8)
+        for window, row in zip([8, 90], means):
+            expected = pd.Series(self.values[:100]).rolling(window, min_periods=8).mean().to_numpy()
+            np.testing.assert_allclose(row, expected, rtol=RTOL, atol=0)
+        self.assertEqual(nvt.rolling_means([], [8]).shape, (1, 0))
+
+    def test_ema(self):
+        spans = [1, 10, 90, 365]
+        for span, row in zip(spans, nvt.ema(self.values, spans)):
+            expected = pd.Series(self.values).ewm(span=span, adjust=False).mean().to_numpy()
+            np.testing.assert_allclose(row, expected, rtol=RTOL, atol=0, err_msg=f'span {span}')
+
+    def test_two_directional_rolling_mean(self):
+        series = pd.Series(self.values)
+        # two_directional_rolling_mean of the notebook with min_periods=0
+        expected = (series.rolling(14, min_periods=0).mean() + series[::-1].rolling(14, min_periods=0).mean()[::-1]) / 2
+        np.testing.assert_allclose(nvt.two_directional_rolling_mean(self.values, 28), expected.to_numpy(),
+                                   rtol=RTOL, atol=0)
+        self.assertRaises(AssertionError, nvt.two_directional_rolling_mean, self.values, 27)
+
+    def test_compute_indicators(self):
+        indicators = nvt.compute_indicators(self.frame, 'market_cap', 'tx_volume', ma_windows=(30, 90), ema_spans=(10,))
+        self.assertEqual(list(indicators.columns), ['NVT', 'MA30_tx_vol', 'NVTnew_MA30', 'MA90_tx_vol', 'NVTnew_MA90',
+                                                    'EMA10_tx_vol', 'NVTnew_EMA10', 'NVTnew', 'NVT_classic'])
+        market_cap, tx_volume = self.frame['market_cap'], self.frame['tx_volume']
+        expected = market_cap / tx_volume.rolling(window=90, min_periods=1).mean()
+        np.testing.assert_allclose(indicators['NVTnew'].to_numpy(), expected.to_numpy(), rtol=RTOL, atol=0)
+        self.assertTrue(indicators['NVTnew'].equals(indicators['NVTnew_MA90']))
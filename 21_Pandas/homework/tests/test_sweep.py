@@ -0,0 +1,77 @@
+import math
+from unittest import TestCase
+
+import numpy as np
+
+import nvt
+import sweep
+
+
+def naive_positions(signal, buy, sell) -> list:
+    held, result = False, []
+    for value in signal:
+        if value > sell:
+            held = False
+        elif value < buy:
+            held = True
+        result.append(held)
+    return result
+
+
+def naive_score(held, log_returns) -> dict:
+    returns = [log_return if position else 0.0 for position, log_return in zip(held[:-1], log_returns[1:])]
+    mean = sum(returns) / len(returns)
+    std = math.sqrt(max(sum(value * value for value in returns) / len(returns) - mean * mean, 0))
+    cumulative, peak, drawdown = 0.0, 0.0, 0.0
+    for value in returns:
+        cumulative += value
+        peak = max(peak, cumulative)
+        drawdown = max(drawdown, peak - cumulative)
+    return {
+        'total_return': math.exp(sum(returns)) - 1,
+        'sharpe': mean / std * math.sqrt(sweep.DAYS_PER_YEAR) if std > 0 else 0.0,
+        'max_drawdown': 1 - math.exp(-drawdown),
+        'trades': sum(before != after for before, after in zip(held, held[1:])),
+        'exposure': sum(held) / len(held),
+    }
+
+
+class TestSweep(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.frame = nvt.load_coinmetrics()
+
+    def test_parse_range(self):
+        np.testing.assert_array_equal(sweep.parse_range('5:20:5'), [5, 10, 15, 20])
+        np.testing.assert_array_equal(sweep.parse_range('0.5:1.5:0.5'), [0.5, 1.0, 1.5])
+        np.testing.assert_array_equal(sweep.parse_range('10,30', int), [10, 30])
+
+    def test_positions_and_score(self):
+        random = np.random.default_rng(0)
+        signal = random.uniform(0, 100, 500)
+        log_returns = np.concatenate(([0.0], random.normal(0, 0.05, 499)))
+        buy, sell = np.array([10.0, 30.0, 50.0]), np.array([40.0, 60.0, 90.0])
+        held = sweep.positions(signal, buy, sell)
+        scores = sweep.score(held, log_returns)
+        for i, buy_threshold in enumerate(buy):
+            for j, sell_threshold in enumerate(sell):
+                expected = naive_positions(signal, buy_threshold, sell_threshold)
+                self.assertEqual(held[i, j].tolist(), expected)
+                for name, value in naive_score(expected, log_returns).items():
+                    self.assertAlmostEqual(scores[name][i, j], value, places=9, msg=name)
+
+    def test_processes(self):
+        buy, sell = sweep.parse_range('5:40:5'), sweep.parse_range('20:80:10')
+        arguments = (self.frame, 'coinmetrics', [10, 30, 90], buy, sell)
+        serial = sweep.sweep(*arguments, processes=1, windows_per_task=1)
+        parallel = sweep.sweep(*arguments, processes=2, windows_per_task=2)
+        self.assertEqual(len(serial), 3 * np.count_nonzero(buy[:, None] < sell[None, :]))
+        self.assertTrue((serial['buy'] < serial['sell']).all())
+        self.assertTrue(serial['sharpe'].is_monotonic_decreasing)
+        self.assertTrue(serial.equals(parallel))
+
+    def test_buy_and_hold(self):
+        log_returns = sweep.prepare(self.frame, 'coinmetrics')[2]
+        result = sweep.buy_and_hold(self.frame, 'coinmetrics')
+        for name, value in naive_score([True] * len(log_returns), log_returns).items():
+            self.assertAlmostEqual(result[name], value, places=9, msg=name)
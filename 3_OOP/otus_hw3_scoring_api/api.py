@@ -1,16 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import json
 import datetime as dt
 import logging
+import time
 from hashlib import sha512
+from hmac import compare_digest
+from functools import lru_cache
 import uuid
 from optparse import OptionParser
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from abc import ABCMeta, abstractmethod
-from scoring import get_score, get_interests
+from scoring import get_score, get_interests, get_clients_interests
+from dates import parse_date
 
+from json_codec import get_codec
+from metrics import METRICS, VALIDATION, AUTH, STORE, SERIALISATION, timed
+from response_cache import RESPONSE_CACHE, CachedResponse
 from store import CACHE_DB, SCORE_CACHE_COLLECTION, CID_INTERESTS_COLLECTION, CacheStore
 
 utcnow = dt.datetime.utcnow
@@ -18,19 +24,28 @@ utcnow = dt.datetime.utcnow
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
 ADMIN_SALT = "42"
+AUTH_CACHE_SIZE = 1024
+MAX_BODY_SIZE = 2 * 1024 * 1024
+MAX_CLIENT_IDS = 100000
 OK = 200
+NOT_MODIFIED = 304
 BAD_REQUEST = 400
 FORBIDDEN = 403
 NOT_FOUND = 404
+REQUEST_ENTITY_TOO_LARGE = 413
 INVALID_REQUEST = 422
 INTERNAL_ERROR = 500
+SERVICE_UNAVAILABLE = 503
 ERRORS = {
     BAD_REQUEST: "Bad Request",
     FORBIDDEN: "Forbidden",
     NOT_FOUND: "Not Found",
+    REQUEST_ENTITY_TOO_LARGE: "Request Entity Too Large",
     INVALID_REQUEST: "Invalid Request",
     INTERNAL_ERROR: "Internal Server Error",
+    SERVICE_UNAVAILABLE: "Service Unavailable",
 }
+UNKNOWN_METHOD = "unknown"
 UNKNOWN = 0
 MALE = 1
 FEMALE = 2
@@ -54,6 +69,9 @@ class BaseRequestField(object):
     """
     __metaclass__ = ABCMeta
 
+    # fields, which validate values against current date, get it as 'today' argument
+    uses_today = False
+
     def __init__(self, required: bool = False, nullable: bool = False):
         # self.name = None
         self.required = required
@@ -97,7 +115,7 @@ class EmailField(CharField):
 
     def validate(self, value):
         super(EmailField, self).validate(value)
-        if not value.__contains__('@'):
+        if '@' not in value:
             raise ValidationError('Invalid e-mail.')
 
 
@@ -112,11 +130,12 @@ class PhoneField(BaseRequestField):
     def validate(self, value):
         if not isinstance(value, (int, str)):
             raise ValidationError('Phone field should be of type "str" or "int".')
-        if not str(value).startswith('7'):
+        phone = str(value)
+        if not phone.startswith('7'):
             raise ValidationError('Only phones, starting with "7", are accepted.')
-        if len(str(value)) != 11:
+        if len(phone) != 11:
             raise ValidationError('Phone should be 11 digits long.')
-        if not all(digit.isdigit() for digit in str(value)):
+        if not phone.isdigit():
             raise ValidationError('All elements of the phone number should be digits.')
 
 
@@ -128,8 +147,8 @@ class DateField(CharField):
     def validate(self, value):
         super(DateField, self).validate(value)
         try:
-            dt.datetime.strptime(value, '%d.%m.%Y')
-        except:
+            parse_date(value)
+        except ValueError:
             raise ValidationError("Incorrect date format. Date should be a DD.MM.YYYY string.")
 
 
@@ -137,10 +156,12 @@ class BirthDayField(DateField):
     """
     Ages over 70 are not allowed for whatever reason.
     """
+    uses_today = True
 
-    def validate(self, value):
+    def validate(self, value, today: dt.date = None):
         super(BirthDayField, self).validate(value)
-        if not (0 < (dt.datetime.now() - dt.datetime.strptime(value, '%d.%m.%Y')).days / 365 <= 70):
+        today = today or dt.date.today()
+        if not (0 < (today - parse_date(value)).days / 365 <= 70):
             raise ValidationError("A request has gracefully failed in an orderly shutdown process "
                                   "due to age related restrictions.")
 
@@ -151,32 +172,86 @@ class GenderField(BaseRequestField):
     """
 
     def validate(self, value):
-        if any([not isinstance(value, int),
-                value not in GENDERS]):
+        if not isinstance(value, int) or value not in GENDERS:
             raise ValidationError('Integer value required. Only 0, 1, 2 allowed.')
 
 
 class ClientIDsField(BaseRequestField):
     """
-    ClientIDs should be a non-empty list of integers.
+    ClientIDs should be a non-empty list of integers, no longer than 'max_length'.
     """
 
+    def __init__(self, required: bool = False, nullable: bool = False, max_length: int = MAX_CLIENT_IDS):
+        super(ClientIDsField, self).__init__(required=required, nullable=nullable)
+        self.max_length = max_length
+
     def validate(self, value):
         if not isinstance(value, list):
             raise ValidationError('Object of type "list" required.')
+        if len(value) > self.max_length:
+            raise ValidationError(f'No more than {self.max_length} ClientIDs allowed.')
         if not all(isinstance(item, int) for item in value):
             raise ValidationError('All elements of a ClientID list should be integers.')
         if not value:
             raise ValidationError('Empty lists not allowed.')
 
 
+def compile_validation_plan(fields: dict):
+    """
+    Compiles fields of a request class into a single validation function.
+    Field properties are resolved once, at class creation time, so validation of a request
+    is a plain pass over a tuple of (name, validator, required, nullable, uses_today) steps.
+    Current date is captured once per validated request.
+
+    :param fields: dict of request class fields;
+    :return: function, which validates a request instance and fills its 'bad_fields'.
+    """
+    plan = tuple((field_name, field.validate, field.required, field.nullable, field.uses_today)
+                 for field_name, field in fields.items())
+    plan_uses_today = any(step[-1] for step in plan)
+
+    def validate(request):
+        passed_fields = request.passed_fields_collector
+        bad_fields = request.bad_fields
+        today = dt.date.today() if plan_uses_today else None
+
+        for field_name, field_validate, required, nullable, uses_today in plan:
+            if required and field_name not in passed_fields:
+                bad_fields[field_name] = f'Required field {field_name} is missing.'
+                continue
+
+            field_value = getattr(request, field_name)
+
+            if not field_value:
+                if not nullable:
+                    bad_fields[field_name] = f'Field {field_name} cannot be empty.'
+                    continue
+                if not required:
+                    continue
+
+            try:
+                if uses_today:
+                    field_validate(field_value, today)
+                else:
+                    field_validate(field_value)
+            except ValidationError as e:
+                bad_fields[field_name] = (
+                    f'Value {field_value} cannot be set for field "{field_name}". Error: {e}.')
+
+    return validate
+
+
 class MetaRequest(type):
     """
     Meta request class, which collects all field classes and moves them into 'fields' attribute.
+    Fields become instance slots, and a validation plan is compiled for each request class.
     """
 
     def __new__(cls, name, bases, attrs):
         current_fields = {}
+        for base in bases:
+            current_fields.update(getattr(base, 'fields', {}))
+
         for field_name, field in list(attrs.items()):
             # if passed argument is a field (BaseRequestField)
             if isinstance(field, BaseRequestField):
@@ -186,45 +261,36 @@ class MetaRequest(type):
                 # pop attributes to ensure all fields are kept only in .fields attr
                 attrs.pop(field_name)
 
+        # base slots are declared in class body, field slots are declared here
+        attrs.setdefault('__slots__', tuple(field_name for field_name in current_fields
+                                            if not any(hasattr(base, field_name) for base in bases)))
+
         new_class = super(MetaRequest, cls).__new__(cls, name, bases, attrs)
         new_class.fields = current_fields
+        new_class.validation_plan = staticmethod(compile_validation_plan(current_fields))
         return new_class
 
 
 class BaseRequest(object, metaclass=MetaRequest):
     """
     Base request class.
+    Passed arguments, which are not fields of a request, are ignored.
     """
+    __slots__ = ('bad_fields', 'passed_fields_collector')
 
     def __init__(self, **passed_fields):
         self.bad_fields = {}
-        self.passed_fields_collector = []
+        self.passed_fields_collector = set()
 
-        for field_name, value in passed_fields.items():
-            setattr(self, field_name, value)
-            self.passed_fields_collector.append(field_name)
+        for field_name in self.fields:
+            if field_name in passed_fields:
+                setattr(self, field_name, passed_fields[field_name])
+                self.passed_fields_collector.add(field_name)
+            else:
+                setattr(self, field_name, None)
 
     def validate(self):
-        for field_name, field in self.fields.items():
-            if all([field_name not in self.passed_fields_collector,
-                    field.required]):
-                self.bad_fields[field_name] = f'Required field {field_name} is missing.'
-                continue
-
-            field_value = getattr(self, field_name, None)
-
-            if not field.nullable and not field_value:
-                self.bad_fields[field_name] = f'Field {field_name} cannot be empty.'
-                continue
-
-            if not field.required and not field_value:
-                continue
-
-            try:
-                self.fields[field_name].validate(field_value)
-            except ValidationError as e:
-                self.bad_fields[field_name] = (
-                    f'Value {field_value} cannot be set for field "{field_name}". Error: {e}.')
+        self.validation_plan(self)
 
 
 class ClientsInterestsRequest(BaseRequest):
@@ -249,7 +315,7 @@ class OnlineScoreRequest(BaseRequest):
 
     @property
     def non_empty_fields(self):
-        return {key for key, value in self.__dict__.items() if value}
+        return {field_name for field_name in self.fields if getattr(self, field_name)}
 
     def validate(self):
         super().validate()
@@ -277,23 +343,54 @@ class MethodRequest(BaseRequest):
         return self.login == ADMIN_LOGIN
 
 
+@lru_cache(maxsize=AUTH_CACHE_SIZE)
+def user_token(account: str, login: str) -> str:
+    """
+    Returns expected auth token for a given account and login. Tokens are cached.
+    """
+    return sha512(f'{account}{login}{SALT}'.encode()).hexdigest()
+
+
+# expected admin token and timestamp, until which it is valid
+_admin_token = (0.0, None)
+
+
+def admin_token() -> str:
+    """
+    Returns expected admin auth token. The token changes once an hour,
+    so it is computed only when the previous one expires.
+    """
+    global _admin_token
+    valid_until, token = _admin_token
+
+    if time.time() >= valid_until:
+        now = dt.datetime.now()
+        token = sha512(f'{now.strftime("%Y%m%d%H")}{ADMIN_SALT}'.encode()).hexdigest()
+        next_hour = now.replace(minute=0, second=0, microsecond=0) + dt.timedelta(hours=1)
+        _admin_token = (next_hour.timestamp(), token)
+
+    return token
+
+
 def check_auth(request: MethodRequest) -> bool:
     """
     Authenticates request.
     If admin's login provided, then admin's salt is used to authenticate.
+    Tokens are compared in constant time.
 
     :param request: valid MethodRequest object.
     :return: True or False, depending on authentication result.
     """
 
+    if not isinstance(request.token, str):
+        return False
+
     if request.is_admin:
-        byte_encoded_str = f'{dt.datetime.now().strftime("%Y%m%d%H")}{ADMIN_SALT}'.encode()
+        digest = admin_token()
     else:
-        byte_encoded_str = f'{request.account}{request.login}{SALT}'.encode()
-
-    digest = sha512(byte_encoded_str).hexdigest()
+        digest = user_token(request.account, request.login)
 
-    return digest == request.token
+    return compare_digest(digest.encode(), request.token.encode())
 
 
 def method_handler(request: dict, ctx: dict, store) -> tuple:
@@ -311,15 +408,22 @@ def method_handler(request: dict, ctx: dict, store) -> tuple:
                "clients_interests": clients_interests}
 
     try:
-        request = MethodRequest(**request.get('body', None))
-        request.validate()
+        with timed(ctx, VALIDATION):
+            request = MethodRequest(**request.get('body', None))
+            request.validate()
     except Exception as e:
         return f'{e}', INVALID_REQUEST
 
+    if request.method in methods:
+        ctx['method'] = request.method
+
     if request.bad_fields:
         return f'{request.bad_fields}', INVALID_REQUEST
 
-    if not check_auth(request):
+    with timed(ctx, AUTH):
+        authorized = check_auth(request)
+
+    if not authorized:
         return "Forbidden", FORBIDDEN
 
     if request.method in methods.keys():
@@ -330,7 +434,8 @@ def method_handler(request: dict, ctx: dict, store) -> tuple:
 
 def online_score(request, ctx, store):
     try:
-        score_request = OnlineScoreRequest(**request.arguments)
+        with timed(ctx, VALIDATION):
+            score_request = OnlineScoreRequest(**request.arguments)
     except Exception as e:
         return f'{e}', INVALID_REQUEST
 
@@ -339,27 +444,42 @@ def online_score(request, ctx, store):
     if request.is_admin:
         return {'score': 42}, OK
 
-    response = {'score': get_score(store=store,
-                                   first_name=score_request.first_name,
-                                   last_name=score_request.last_name,
-                                   email=score_request.email,
-                                   phone=score_request.phone,
-                                   birthday=score_request.birthday,
-                                   gender=score_request.gender)}
+    with timed(ctx, STORE):
+        response = {'score': get_score(store=store,
+                                       first_name=score_request.first_name,
+                                       last_name=score_request.last_name,
+                                       email=score_request.email,
+                                       phone=score_request.phone,
+                                       birthday=score_request.birthday,
+                                       gender=score_request.gender)}
     return response, OK
 
 
 def clients_interests(request, ctx, store):
     try:
-        interests_requests = ClientsInterestsRequest(**request.arguments)
+        with timed(ctx, VALIDATION):
+            interests_requests = ClientsInterestsRequest(**request.arguments)
+            interests_requests.validate()
     except Exception as e:
         return f'{e}', INVALID_REQUEST
 
+    if interests_requests.bad_fields:
+        return f'{interests_requests.bad_fields}', INVALID_REQUEST
+
     client_ids = set(interests_requests.client_ids)
 
     ctx['nclients'] = len(client_ids)
 
-    response = {client_id: get_interests(store, client_id) for client_id in client_ids}
+    if RESPONSE_CACHE.enabled:
+        cache_key = RESPONSE_CACHE.make_key("clients_interests", client_ids, interests_requests.date)
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached, OK
+        # encoded response is cached by MainHTTPHandler
+        ctx['response_cache_key'] = cache_key
+
+    with timed(ctx, STORE):
+        response = get_clients_interests(store, client_ids)
 
     return response, OK
 
@@ -369,6 +489,8 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
     Server.
     """
     router = {"method": method_handler}
+    codec = get_codec()
+    max_body_size = MAX_BODY_SIZE
     store = CacheStore(db=CACHE_DB,
                        score_collection=SCORE_CACHE_COLLECTION,
                        cid_interests_collection=CID_INTERESTS_COLLECTION)
@@ -376,24 +498,59 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
     def get_request_id(self, headers):
         return headers.get('HTTP_X_REQUEST_ID', uuid.uuid4().hex)
 
+    def send_json(self, code: int, body: bytes, etag: str = None):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_not_modified(self, etag: str) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if not etag or not if_none_match:
+            return False
+        return if_none_match.strip() == "*" or etag in {tag.strip() for tag in if_none_match.split(",")}
+
+    def do_GET(self):
+        path = self.path.strip("/")
+        if path == "metrics":
+            self.send_json(OK, self.codec.dumps(METRICS.snapshot()))
+        elif path == "ready":
+            code = OK if self.store.is_ready() else SERVICE_UNAVAILABLE
+            self.send_json(code, self.codec.dumps({"ready": code == OK, "code": code}))
+        else:
+            self.send_json(NOT_FOUND, self.codec.dumps({"error": ERRORS[NOT_FOUND], "code": NOT_FOUND}))
+
     def do_POST(self):
+        started = time.perf_counter()
         response, code = {}, OK
         context = {"request_id": self.get_request_id(self.headers)}
         request = None
         try:
-            data_string = self.rfile.read(int(self.headers['Content-Length']))
-            request = json.loads(data_string)
+            content_length = int(self.headers['Content-Length'])
+            if content_length < 0:
+                raise ValueError('Negative Content-Length.')
+            if content_length > self.max_body_size:
+                # body is not read at all, connection is closed after response
+                code = REQUEST_ENTITY_TOO_LARGE
+                self.close_connection = True
+            else:
+                data_string = self.rfile.read(content_length)
+                with timed(context, SERIALISATION):
+                    request = self.codec.loads(data_string)
         except:
             code = BAD_REQUEST
 
         if request:
             path = self.path.strip("/")
-            logging.info("%s: %s %s" % (self.path, data_string, context["request_id"]))
+            logging.info("%s: %s %s", self.path, data_string, context["request_id"])
             if path in self.router:
                 try:
                     response, code = self.router[path]({"body": request, "headers": self.headers}, context, self.store)
                 except Exception as e:
-                    logging.exception("Unexpected error: %s" % e)
+                    logging.exception("Unexpected error: %s", e)
                     code = INTERNAL_ERROR
             else:
                 code = NOT_FOUND
@@ -401,18 +558,37 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
         if not code:
             code = INVALID_REQUEST
 
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
+        etag = None
+        cache_key = context.pop("response_cache_key", None)
+        if isinstance(response, CachedResponse):
+            # cached response is encoded already
+            body, etag = response.body, response.etag
+        else:
+            if code not in ERRORS:
+                r = {"response": response, "code": code}
+            else:
+                r = {"error": response or ERRORS.get(code, "Unknown Error"), "code": code}
+
+            # response is serialised once, log record reuses encoded body
+            with timed(context, SERIALISATION):
+                body = self.codec.dumps(r)
+
+            if cache_key is not None and code == OK:
+                etag = RESPONSE_CACHE.set(cache_key, body).etag
+        logging.info("%s %s", context, body)
 
-        if code not in ERRORS:
-            r = {"response": response, "code": code}
+        if self.is_not_modified(etag):
+            code = NOT_MODIFIED
+            self.send_response(code)
+            self.send_header("ETag", etag)
+            self.end_headers()
         else:
-            r = {"error": response or ERRORS.get(code, "Unknown Error"), "code": code}
+            self.send_json(code, body, etag)
 
-        context.update(r)
-        logging.info(context)
-        self.wfile.write(json.dumps(r).encode())
+        METRICS.incr(f"responses_{code}")
+        METRICS.observe_request(method=context.get("method", UNKNOWN_METHOD),
+                                timings=context["timings"],
+                                total=time.perf_counter() - started)
         return
 
 
@@ -420,11 +596,21 @@ if __name__ == "__main__":
     op = OptionParser()
     op.add_option("-p", "--port", action="store", type=int, default=8080)
     op.add_option("-l", "--log", action="store", default=None)
+    op.add_option("-j", "--json", action="store", default=None, help="JSON codec: json, orjson or ujson")
+    op.add_option("-m", "--max-body-size", action="store", type=int, default=MAX_BODY_SIZE,
+                  help="max request body size, bytes")
+    op.add_option("-c", "--response-cache-ttl", action="store", type=float, default=0,
+                  help="TTL of clients_interests response cache, seconds; 0 disables the cache")
     (opts, args) = op.parse_args()
+    RESPONSE_CACHE.configure(ttl=opts.response_cache_ttl)
+    MainHTTPHandler.codec = get_codec(opts.json)
+    MainHTTPHandler.max_body_size = opts.max_body_size
     logging.basicConfig(filename=opts.log, level=logging.INFO,
                         format='[%(asctime)s] %(levelname).1s %(message)s', datefmt='%Y.%m.%d %H:%M:%S')
+    # connects to the store and creates indexes in background, while server starts
+    MainHTTPHandler.store.ensure_indexes()
     server = HTTPServer(("localhost", opts.port), MainHTTPHandler)
-    logging.info("Starting server at %s" % opts.port)
+    logging.info("Starting server at %s, JSON codec: %s", opts.port, MainHTTPHandler.codec.name)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
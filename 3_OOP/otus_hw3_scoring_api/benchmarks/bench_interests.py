@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares JSON-encoded clients' interests with interned bitmasks:
+BSON document size in cid_interests collection and decode time per client.
+
+Run from the project directory:
+
+    python benchmarks/bench_interests.py
+"""
+import json
+import os
+import sys
+from optparse import OptionParser
+from timeit import repeat
+
+import bson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from interests import Vocabulary, SAMPLE_INTERESTS, random_interests
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("-c", "--clients", action="store", type=int, default=10000)
+    op.add_option("-r", "--repeat", action="store", type=int, default=5)
+    (opts, args) = op.parse_args()
+
+    data = random_interests(range(1, opts.clients + 1))
+    vocabulary = Vocabulary(SAMPLE_INTERESTS)
+    as_json = [json.dumps(client_interests) for client_interests in data.values()]
+    as_masks = [vocabulary.encode(client_interests) for client_interests in data.values()]
+
+    for name, values, decode in (('json', as_json, json.loads), ('bitmask', as_masks, vocabulary.decode)):
+        size = sum(len(bson.encode({'_id': f'i:{cid}', 'interests': value})) for cid, value in zip(data, values))
+        best = min(repeat(lambda: [decode(value) for value in values], number=1, repeat=opts.repeat))
+        print(f'{name:<8} {size / opts.clients:6.1f} bytes per document, '
+              f'{best / opts.clients * 1e6:6.3f} us per client decode')
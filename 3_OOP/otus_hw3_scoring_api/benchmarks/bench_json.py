@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures JSON decode of clients_interests requests and encode of their responses
+for every installed JSON codec and growing client_ids lists.
+
+Run from the project directory:
+
+    python benchmarks/bench_json.py --sizes 10,1000,100000
+"""
+import os
+import random
+import sys
+from optparse import OptionParser
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from json_codec import CODECS
+
+INTERESTS = ["cars", "pets", "travel", "hi-tech", "sport", "music", "books", "tv", "cinema", "geek", "otus"]
+
+
+def make_request(size: int) -> dict:
+    return {'account': 'horns&hoofs',
+            'login': 'h&f',
+            'method': 'clients_interests',
+            'token': 'token',
+            'arguments': {'client_ids': list(range(1, size + 1)), 'date': '20.07.2017'}}
+
+
+def make_response(size: int) -> dict:
+    return {'response': {client_id: random.sample(INTERESTS, 2) for client_id in range(1, size + 1)},
+            'code': 200}
+
+
+def best_time(func, number: int, repeats: int) -> float:
+    return min(repeat(func, number=number, repeat=repeats)) / number
+
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("-s", "--sizes", action="store", default="10,100,1000,10000,100000",
+                  help="comma separated client_ids list sizes")
+    op.add_option("-r", "--repeat", action="store", type=int, default=5)
+    (opts, args) = op.parse_args()
+
+    print(f'{"codec":<8}{"client_ids":>12}{"request KB":>12}{"loads, us":>14}{"dumps, us":>14}')
+    for size in map(int, opts.sizes.split(',')):
+        # keeps total time per measurement roughly the same for all sizes
+        number = max(1, 100000 // size)
+        request_body = CODECS['json'].dumps(make_request(size))
+        response = make_response(size)
+
+        for codec in CODECS.values():
+            loads_time = best_time(lambda: codec.loads(request_body), number, opts.repeat)
+            dumps_time = best_time(lambda: codec.dumps(response), number, opts.repeat)
+            print(f'{codec.name:<8}{size:>12}{len(request_body) / 1024:>12.1f}'
+                  f'{loads_time * 1e6:>14.1f}{dumps_time * 1e6:>14.1f}')
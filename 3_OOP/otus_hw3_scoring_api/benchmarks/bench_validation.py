@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures validation cost per request of MethodRequest + OnlineScoreRequest.
+
+Run from the project directory:
+
+    python benchmarks/bench_validation.py -n 100000
+"""
+import os
+import sys
+from optparse import OptionParser
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import api
+
+REQUEST_BODY = {'account': 'horns&hoofs',
+                'login': 'h&f',
+                'method': 'online_score',
+                'token': '55cc9ce545bcd144300fe9efc28e65d415b923ebb6be1e19d2750a2c03e80dd209a27954dca045e5bb1241'
+                         '8e7d89b6d718a9e35af34e14e1d5bcd5a08f21fc95',
+                'arguments': {'phone': '77777777777',
+                              'email': 'jake@otus.ru',
+                              'first_name': 'Jake',
+                              'last_name': 'Jackson',
+                              'birthday': '01.01.1990',
+                              'gender': 1}}
+
+
+def validate_request(body: dict = REQUEST_BODY):
+    method_request = api.MethodRequest(**body)
+    method_request.validate()
+    score_request = api.OnlineScoreRequest(**method_request.arguments)
+    score_request.validate()
+    return method_request.bad_fields or score_request.bad_fields
+
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("-n", "--number", action="store", type=int, default=100000)
+    op.add_option("-r", "--repeat", action="store", type=int, default=5)
+    (opts, args) = op.parse_args()
+
+    assert not validate_request(), 'Benchmark request should be valid.'
+    best = min(repeat(validate_request, number=opts.number, repeat=opts.repeat))
+    print(f'MethodRequest + OnlineScoreRequest validation: {best / opts.number * 1e6:.2f} us per request '
+          f'(best of {opts.repeat}, {opts.number} requests each)')
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Load generator for the scoring API.
+
+Starts api server in a subprocess with an in-memory (or mongomock) store, replays mixed
+online_score / clients_interests traffic with skewed keys from a pool of worker processes
+and reports RPS and latency percentiles per method.
+
+Run from the project directory:
+
+    python benchmarks/load_test.py --concurrency 4 --requests 2000 --interests-ratio 0.5 --ids-max 100
+
+Use --url to load an already running server instead, e.g. --url http://127.0.0.1:8080/method/.
+In that case the store is not populated by the harness.
+"""
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from http.client import HTTPConnection
+from multiprocessing import Pool
+from optparse import OptionParser, SUPPRESS_HELP
+from urllib.parse import urlsplit
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, PROJECT_DIR)
+
+ACCOUNT = 'horns&hoofs'
+LOGIN = 'h&f'
+TOKEN = ('55cc9ce545bcd144300fe9efc28e65d415b923ebb6be1e19d2750a2c03e80dd209a27954dca045e5bb12418e7d89b6d718a'
+         '9e35af34e14e1d5bcd5a08f21fc95')
+
+
+def make_store(kind: str, keys: int):
+    """
+    Builds a store for the server and populates clients' interests for client ids 1..keys.
+
+    :param kind: 'memory' or 'mongomock';
+    :param keys: number of client ids.
+    """
+    if kind == 'mongomock':
+        import mongomock
+        import pymongo
+        # must be patched before store module creates its client
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import store
+    from interests import load_interests, random_interests
+
+    if kind == 'memory':
+        cache_store = store.MemoryStore()
+    else:
+        cache_store = store.CacheStore(db=store.CACHE_DB,
+                                       score_collection=store.SCORE_CACHE_COLLECTION,
+                                       cid_interests_collection=store.CID_INTERESTS_COLLECTION)
+
+    load_interests(cache_store, random_interests(range(1, keys + 1)))
+    return cache_store
+
+
+def serve(port: int, store_kind: str, keys: int, response_cache_ttl: float):
+    cache_store = make_store(store_kind, keys)
+
+    from http.server import HTTPServer
+    import api
+
+    api.RESPONSE_CACHE.configure(ttl=response_cache_ttl)
+    api.MainHTTPHandler.store = cache_store
+    # request logging is not a part of what is measured
+    api.MainHTTPHandler.log_message = lambda *args: None
+    server = HTTPServer(("localhost", port), api.MainHTTPHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(host: str, port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server at {host}:{port} has not started in {timeout} seconds.')
+
+
+def skewed_sampler(rnd: random.Random, keys: int, skew: float):
+    """
+    Returns function, which samples keys 1..keys with Zipf-like weights 1 / rank ** skew.
+    skew = 0 gives uniform distribution.
+    """
+    cum_weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, keys + 1)))
+    population = range(1, keys + 1)
+    return lambda k=1: rnd.choices(population, cum_weights=cum_weights, k=k)
+
+
+def make_body(rnd: random.Random, sample, opts) -> tuple:
+    body = {'account': ACCOUNT, 'login': LOGIN, 'token': TOKEN}
+
+    if rnd.random() < opts.interests_ratio:
+        body['method'] = 'clients_interests'
+        body['arguments'] = {'client_ids': sample(rnd.randint(opts.ids_min, opts.ids_max)),
+                             'date': '20.07.2017'}
+    else:
+        key = sample()[0]
+        body['method'] = 'online_score'
+        body['arguments'] = {'phone': '79175002040',
+                             'email': 'stupnikov@otus.ru',
+                             'first_name': f'first_name_{key}',
+                             'last_name': f'last_name_{key}',
+                             'birthday': '01.01.1990',
+                             'gender': 1}
+
+    return body['method'], json.dumps(body).encode()
+
+
+def run_worker(args) -> list:
+    """
+    Sends requests one after another.
+
+    :return: list of (method, status, latency in seconds).
+    """
+    seed, requests_number, opts = args
+    rnd = random.Random(seed)
+    sample = skewed_sampler(rnd, opts.keys, opts.skew)
+    host, port, path = opts.host, opts.port, opts.path
+    results = []
+
+    for _ in range(requests_number):
+        method, body = make_body(rnd, sample, opts)
+        started = time.perf_counter()
+        connection = HTTPConnection(host, port, timeout=30)
+        try:
+            connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            status = 0
+        finally:
+            connection.close()
+        results.append((method, status, time.perf_counter() - started))
+
+    return results
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def report(results: list, elapsed: float):
+    print(f'{len(results)} requests in {elapsed:.2f} s, {len(results) / elapsed:.1f} RPS')
+    print(f'{"method":<20}{"requests":>10}{"errors":>8}{"RPS":>10}{"p50, ms":>10}{"p99, ms":>10}')
+
+    by_method = {}
+    for method, status, latency in results:
+        by_method.setdefault(method, []).append((status, latency))
+    by_method['all'] = [(status, latency) for _, status, latency in results]
+
+    for method, method_results in by_method.items():
+        latencies = sorted(latency for _, latency in method_results)
+        errors = sum(1 for status, _ in method_results if status != 200)
+        print(f'{method:<20}{len(method_results):>10}{errors:>8}{len(method_results) / elapsed:>10.1f}'
+              f'{percentile(latencies, 0.5) * 1e3:>10.2f}{percentile(latencies, 0.99) * 1e3:>10.2f}')
+
+
+if __name__ == '__main__':
+    op = OptionParser()
+    op.add_option("--url", action="store", default=None, help="load an already running server")
+    op.add_option("--store", action="store", default="memory", help="store of a started server: memory, mongomock")
+    op.add_option("--response-cache-ttl", action="store", type=float, default=0,
+                  help="TTL of clients_interests response cache of a started server, seconds")
+    op.add_option("-c", "--concurrency", action="store", type=int, default=4)
+    op.add_option("-n", "--requests", action="store", type=int, default=2000)
+    op.add_option("--interests-ratio", action="store", type=float, default=0.5,
+                  help="share of clients_interests requests")
+    op.add_option("--keys", action="store", type=int, default=10000, help="number of distinct users and client ids")
+    op.add_option("--skew", action="store", type=float, default=1.0, help="Zipf exponent of key popularity")
+    op.add_option("--ids-min", action="store", type=int, default=1)
+    op.add_option("--ids-max", action="store", type=int, default=50)
+    op.add_option("--seed", action="store", type=int, default=0)
+    # internal: runs server on a given port
+    op.add_option("--serve", action="store", type=int, default=None, help=SUPPRESS_HELP)
+    (opts, args) = op.parse_args()
+
+    if opts.serve:
+        serve(opts.serve, opts.store, opts.keys, opts.response_cache_ttl)
+        sys.exit()
+
+    server_process = None
+    if opts.url:
+        url = urlsplit(opts.url)
+        opts.host, opts.port, opts.path = url.hostname, url.port or 80, url.path or '/method/'
+    else:
+        opts.host, opts.port, opts.path = "localhost", free_port(), "/method/"
+        server_process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(opts.port),
+                                           '--store', opts.store, '--keys', str(opts.keys),
+                                           '--response-cache-ttl', str(opts.response_cache_ttl)], cwd=PROJECT_DIR)
+
+    try:
+        wait_for_server(opts.host, opts.port)
+        shares = [opts.requests // opts.concurrency + (worker < opts.requests % opts.concurrency)
+                  for worker in range(opts.concurrency)]
+        with Pool(opts.concurrency) as pool:
+            started = time.perf_counter()
+            worker_results = pool.map(run_worker, [(opts.seed + worker, share, opts)
+                                                   for worker, share in enumerate(shares)])
+            elapsed = time.perf_counter() - started
+    finally:
+        if server_process:
+            server_process.terminate()
+            server_process.wait()
+
+    report(list(itertools.chain.from_iterable(worker_results)), elapsed)
@@ -0,0 +1,23 @@
+import datetime as dt
+from functools import lru_cache
+
+DATE_FORMAT = '%d.%m.%Y'
+DATE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value: str) -> dt.date:
+    """
+    Parses DD.MM.YYYY date string. Parsed dates are cached.
+    Strings of exact DD.MM.YYYY shape are parsed by hand, anything else falls back to strptime,
+    so accepted values are the same as for strptime with DATE_FORMAT.
+
+    :param value: date string, like '01.02.1990';
+    :return: date object. Raises ValueError for invalid date strings.
+    """
+    if len(value) == 10 and value[2] == value[5] == '.':
+        day, month, year = value[:2], value[3:5], value[6:]
+        if day.isdigit() and month.isdigit() and year.isdigit():
+            return dt.date(int(year), int(month), int(day))
+
+    return dt.datetime.strptime(value, DATE_FORMAT).date()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compact encoding of clients' interests.
+
+Interests are drawn from a small vocabulary, so each word is interned once and gets a sequential id.
+A set of interests is stored as a bitmask of word ids, or as a list of word ids,
+if some id does not fit into MongoDB 64-bit integer.
+Vocabulary is kept in the store next to clients' interests and is append-only,
+so stored interests stay valid, when new words are added.
+"""
+import json
+import logging
+import random
+from optparse import OptionParser
+from typing import Union
+from weakref import WeakKeyDictionary
+
+INTERESTS_COLLECTION = 'cid_interests_collection'
+INTERESTS_VALUE_NAME = 'interests'
+VOCABULARY_KEY = 'vocabulary'
+VOCABULARY_VALUE_NAME = 'words'
+# MongoDB integers are signed 64-bit
+MAX_MASK_BITS = 63
+LOAD_CHUNK_SIZE = 1000
+SAMPLE_INTERESTS = ["cars", "pets", "travel", "hi-tech", "sport", "music", "books", "tv", "cinema", "geek", "otus"]
+
+
+class Vocabulary:
+    """
+    Interned vocabulary of interests with a cache of decoded bitmasks.
+    """
+
+    def __init__(self, words=()):
+        self.words = list(words)
+        self.ids = {word: word_id for word_id, word in enumerate(self.words)}
+        self.decoded_masks = {}
+
+    def intern(self, word: str) -> int:
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = self.ids[word] = len(self.words)
+            self.words.append(word)
+        return word_id
+
+    def encode(self, interests) -> Union[int, list]:
+        """
+        Encodes interests, interning new words.
+
+        :param interests: iterable of interests, like ['cars', 'pets'];
+        :return: bitmask of word ids or list of word ids.
+        """
+        word_ids = sorted({self.intern(word) for word in interests})
+        if not word_ids or word_ids[-1] < MAX_MASK_BITS:
+            mask = 0
+            for word_id in word_ids:
+                mask |= 1 << word_id
+            return mask
+        return word_ids
+
+    def decode(self, value: Union[int, list], skip_unknown: bool = False) -> list:
+        """
+        Decodes interests. Decoded bitmasks are cached.
+        Raises IndexError, if value refers to words, which are not in this vocabulary, unless skip_unknown is set.
+
+        :param value: bitmask of word ids or list of word ids;
+        :param skip_unknown: drop ids of words, which are not in this vocabulary;
+        :return: list of interests.
+        """
+        if isinstance(value, list):
+            if skip_unknown:
+                return [self.words[word_id] for word_id in value if word_id < len(self.words)]
+            return [self.words[word_id] for word_id in value]
+
+        if skip_unknown:
+            value &= (1 << len(self.words)) - 1
+        decoded = self.decoded_masks.get(value)
+        if decoded is None:
+            if value >> len(self.words):
+                raise IndexError(f'Bitmask {value} refers to unknown words.')
+            decoded = self.decoded_masks[value] = tuple(word for word_id, word in enumerate(self.words)
+                                                        if value >> word_id & 1)
+        return list(decoded)
+
+
+# vocabulary loaded from each store
+_vocabularies = WeakKeyDictionary()
+
+
+def get_vocabulary(store, reload: bool = False) -> Vocabulary:
+    vocabulary = None if reload else _vocabularies.get(store)
+    if vocabulary is None:
+        words = store.cache_get(VOCABULARY_KEY,
+                                collection=INTERESTS_COLLECTION,
+                                target_value_name=VOCABULARY_VALUE_NAME)
+        vocabulary = _vocabularies[store] = Vocabulary(words or ())
+    return vocabulary
+
+
+def decode_interests(store, value) -> list:
+    """
+    Decodes stored interests value. Legacy JSON-encoded lists are decoded too.
+    Words, which are missing from a reloaded vocabulary, are logged and skipped.
+
+    :param store: store, which keeps vocabulary;
+    :param value: stored value or None;
+    :return: list of interests.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+
+    try:
+        return get_vocabulary(store).decode(value)
+    except IndexError:
+        pass
+
+    # vocabulary has grown since it was loaded
+    vocabulary = get_vocabulary(store, reload=True)
+    try:
+        return vocabulary.decode(value)
+    except IndexError:
+        logging.warning("Interests %s refer to words missing from vocabulary, unknown words are skipped", value)
+        return vocabulary.decode(value, skip_unknown=True)
+
+
+def load_interests(store, interests: dict, chunk_size: int = LOAD_CHUNK_SIZE) -> int:
+    """
+    Bulk loader of clients' interests. Interns words, saves vocabulary and writes encoded interests
+    in chunks of 'chunk_size' clients. Existing interests of given clients are replaced.
+    Only one loader should run at a time.
+
+    :param store: store with 'set_many' method;
+    :param interests: dict of client id and iterable of interests;
+    :param chunk_size: number of clients per write;
+    :return: number of loaded clients.
+    """
+    vocabulary = get_vocabulary(store, reload=True)
+    encoded = {f'i:{cid}': vocabulary.encode(client_interests) for cid, client_interests in interests.items()}
+
+    # vocabulary is saved first, so that every stored value can be decoded
+    store.set_many({VOCABULARY_KEY: vocabulary.words},
+                   collection=INTERESTS_COLLECTION, target_value_name=VOCABULARY_VALUE_NAME)
+    store.set_many(encoded, collection=INTERESTS_COLLECTION, target_value_name=INTERESTS_VALUE_NAME,
+                   chunk_size=chunk_size)
+    return len(encoded)
+
+
+def random_interests(cids, seed: int = 0, words: list = SAMPLE_INTERESTS, size: int = 2) -> dict:
+    rnd = random.Random(seed)
+    return {cid: rnd.sample(words, size) for cid in cids}
+
+
+if __name__ == "__main__":
+    op = OptionParser(usage="%prog [--input FILE | --random N]")
+    op.add_option("-i", "--input", action="store", default=None,
+                  help='JSON lines file, like {"cid": 1, "interests": ["cars", "pets"]}')
+    op.add_option("-r", "--random", action="store", type=int, default=None,
+                  help="load random interests for client ids 1..N")
+    (opts, args) = op.parse_args()
+
+    if opts.input:
+        with open(opts.input) as f:
+            data = {}
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    data[record['cid']] = record['interests']
+    elif opts.random:
+        data = random_interests(range(1, opts.random + 1))
+    else:
+        op.error("either --input or --random is required")
+
+    import store
+
+    cache_store = store.CacheStore(db=store.CACHE_DB,
+                                   score_collection=store.SCORE_CACHE_COLLECTION,
+                                   cid_interests_collection=store.CID_INTERESTS_COLLECTION)
+    print(f'{load_interests(cache_store, data)} clients loaded.')
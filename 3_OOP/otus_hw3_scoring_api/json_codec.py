@@ -0,0 +1,49 @@
+import json
+from collections import namedtuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# loads takes bytes or str, dumps returns bytes
+Codec = namedtuple('Codec', ['name', 'loads', 'dumps'])
+
+CODECS = {'json': Codec(name='json',
+                        loads=json.loads,
+                        dumps=lambda obj: json.dumps(obj).encode())}
+
+if orjson is not None:
+    # client ids are integer keys of clients_interests response
+    CODECS['orjson'] = Codec(name='orjson',
+                             loads=orjson.loads,
+                             dumps=lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+
+if ujson is not None:
+    CODECS['ujson'] = Codec(name='ujson',
+                            loads=ujson.loads,
+                            dumps=lambda obj: ujson.dumps(obj, ensure_ascii=False).encode())
+
+# fastest available codec goes first
+PREFERRED_CODECS = ('orjson', 'ujson', 'json')
+
+
+def get_codec(name: str = None) -> Codec:
+    """
+    Returns JSON codec by name. If no name passed, returns the fastest installed codec.
+
+    :param name: 'json', 'orjson', 'ujson' or None;
+    :return: Codec. Raises ValueError, if codec is unknown or not installed.
+    """
+    if name is None:
+        return next(CODECS[codec_name] for codec_name in PREFERRED_CODECS if codec_name in CODECS)
+
+    if name not in CODECS:
+        raise ValueError(f'JSON codec "{name}" is not available. Available codecs: {", ".join(CODECS)}.')
+
+    return CODECS[name]
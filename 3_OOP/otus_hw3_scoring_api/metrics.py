@@ -0,0 +1,111 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+# upper bounds of latency buckets, seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+VALIDATION = 'validation'
+AUTH = 'auth'
+STORE = 'store'
+SERIALISATION = 'serialisation'
+TOTAL = 'total'
+PHASES = (VALIDATION, AUTH, STORE, SERIALISATION)
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets. Keeps count of observations per bucket,
+    total count and sum of observed values.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # the last bucket collects values above the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        """
+        :return: dict with cumulative bucket counts, keyed by bucket upper bound, count and sum.
+        """
+        buckets, cumulative = {}, 0
+        for bound, bucket_count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {'buckets': buckets, 'count': self.count, 'sum': self.sum}
+
+
+class Metrics:
+    """
+    In-process registry of per-method latency histograms, split by request phase, and of counters.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+
+    def observe(self, method: str, phase: str, value: float):
+        with self.lock:
+            self.histograms[(method, phase)].observe(value)
+
+    def observe_request(self, method: str, timings: dict, total: float):
+        """
+        Records phase timings of a single request and its total latency.
+
+        :param method: request method name;
+        :param timings: dict of phase name and seconds spent in it;
+        :param total: total request latency, seconds.
+        """
+        with self.lock:
+            for phase, value in timings.items():
+                self.histograms[(method, phase)].observe(value)
+            self.histograms[(method, TOTAL)].observe(total)
+
+    def incr(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict:
+        """
+        :return: JSON serialisable dict of latency histograms, like
+        {'latency': {<method>: {<phase>: <histogram>}}, 'counters': {<name>: <value>}}.
+        """
+        with self.lock:
+            latency = defaultdict(dict)
+            for (method, phase), histogram in sorted(self.histograms.items()):
+                latency[method][phase] = histogram.snapshot()
+            return {'latency': dict(latency), 'counters': dict(sorted(self.counters.items()))}
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def timed(ctx: dict, phase: str):
+    """
+    Adds time spent in a block to request context timings of a given phase.
+
+    :param ctx: request context;
+    :param phase: request phase name.
+    """
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings = ctx.setdefault('timings', {})
+        timings[phase] = timings.get(phase, 0.0) + perf_counter() - started
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+from metrics import METRICS
+
+DEFAULT_TTL = 5
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# encoded response body and its ETag
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag'])
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded responses with a short TTL.
+    Size is bounded both by number of entries and by total size of cached bodies.
+    Cache with zero TTL is disabled.
+    """
+
+    def __init__(self, ttl: float = 0, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.configure(ttl, max_entries, max_bytes)
+
+    def configure(self, ttl: float, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        with self.lock:
+            self.ttl = ttl
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self.entries.clear()
+            self.size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def make_key(method: str, client_ids, date: str = None) -> tuple:
+        """
+        Normalises request arguments into a cache key: order and duplicates of client ids do not matter.
+        """
+        return method, tuple(sorted(set(client_ids))), date
+
+    def get(self, key) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._pop(key)
+                METRICS.incr('response_cache_miss')
+                return None
+            self.entries.move_to_end(key)
+            METRICS.incr('response_cache_hit')
+            return entry[1]
+
+    def set(self, key, body: bytes, etag: str = None) -> CachedResponse:
+        cached = CachedResponse(body=body, etag=etag or make_etag(body))
+        if len(body) > self.max_bytes:
+            return cached
+
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, cached)
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+        return cached
+
+    def _pop(self, key):
+        _, cached = self.entries.pop(key)
+        self.size -= len(cached.body)
+
+
+RESPONSE_CACHE = ResponseCache()
@@ -1,13 +1,14 @@
 import hashlib
-import json
-import datetime as dt
+
+from dates import parse_date
+from interests import decode_interests
 
 
 def get_score(store, phone, email, birthday=None, gender=None, first_name=None, last_name=None):
     try:
         key_parts = [first_name or "",
                      last_name or "",
-                     dt.datetime.strptime('01.02.1990', '%d.%m.%Y').strftime("%Y%m%d")]
+                     parse_date(birthday).strftime("%Y%m%d") if birthday else ""]
         key = "uid:" + hashlib.md5("".join(key_parts).encode()).hexdigest()
     except:
         key = None
@@ -42,5 +43,17 @@ def get_score(store, phone, email, birthday=None, gender=None, first_name=None,
 
 
 def get_interests(store, cid):
-    r = store.get("i:%s" % cid)
-    return json.loads(r) if r else []
+    return decode_interests(store, store.get("i:%s" % cid))
+
+
+def get_clients_interests(store, cids) -> dict:
+    """
+    Gets interests for many clients at once. Store fetches them in chunks.
+
+    :param store: store with 'get_many' method;
+    :param cids: iterable of client ids;
+    :return: dict of client id and list of interests.
+    """
+    keys = {"i:%s" % cid: cid for cid in cids}
+    found = store.get_many(list(keys))
+    return {cid: decode_interests(store, found.get(key)) for key, cid in keys.items()}
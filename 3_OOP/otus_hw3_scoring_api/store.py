@@ -1,26 +1,103 @@
 import datetime as dt
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, ReplaceOne
 from pymongo.errors import ConnectionFailure, DuplicateKeyError
 
+from metrics import METRICS
+
 utcnow = dt.datetime.utcnow
 
 CACHE_DB = 'Otus_HW4_score_cache'
 SCORE_CACHE_COLLECTION = 'score_cache'
 CID_INTERESTS_COLLECTION = 'cid_interests'
+# number of keys fetched from store in one query
+STORE_CHUNK_SIZE = 1000
+# connect=False defers connection until the first operation
+CLIENT_OPTIONS = dict(socketTimeoutMS=5000, connectTimeoutMS=10000, serverSelectionTimeoutMS=5000, connect=False)
+# readiness probes run on the single-threaded server, so they give up quickly
+PROBE_CLIENT_OPTIONS = dict(CLIENT_OPTIONS, socketTimeoutMS=500, connectTimeoutMS=500, serverSelectionTimeoutMS=500)
 
 
 class CacheStore:
-    client = MongoClient(socketTimeoutMS=5000, connectTimeoutMS=10000)
+    """
+    MongoDB based store. Connection is established on first use, indexes are created in background,
+    so creating a store does no network I/O.
+    """
+    # MongoDB client is shared by all stores and created on first use
+    _client = None
+    _probe_client = None
+    _client_lock = threading.Lock()
 
     def __init__(self, db, score_collection, cid_interests_collection):
-        self.db = getattr(self.client, f'{db}')
-        self.score_collection = getattr(self.db, f'{score_collection}')
-        self.cid_interests_collection = getattr(self.db, f'{cid_interests_collection}')
+        self.db_name = db
+        self.score_collection_name = score_collection
+        self.cid_interests_collection_name = cid_interests_collection
+        self.indexes_thread = None
+        self.indexes_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if CacheStore._client is None:
+            with CacheStore._client_lock:
+                if CacheStore._client is None:
+                    CacheStore._client = MongoClient(**CLIENT_OPTIONS)
+        return CacheStore._client
+
+    @property
+    def probe_client(self):
+        if CacheStore._probe_client is None:
+            with CacheStore._client_lock:
+                if CacheStore._probe_client is None:
+                    CacheStore._probe_client = MongoClient(**PROBE_CLIENT_OPTIONS)
+        return CacheStore._probe_client
+
+    @property
+    def db(self):
+        return getattr(self.client, f'{self.db_name}')
+
+    @property
+    def score_collection(self):
+        if self.indexes_thread is None:
+            self.ensure_indexes()
+        return getattr(self.db, f'{self.score_collection_name}')
+
+    @property
+    def cid_interests_collection(self):
+        return getattr(self.db, f'{self.cid_interests_collection_name}')
 
+    def create_indexes(self):
+        created = False
         try:
-            self.score_collection.create_index("expireAt", expireAfterSeconds=0)
+            getattr(self.db, f'{self.score_collection_name}').create_index("expireAt", expireAfterSeconds=0)
+            created = True
         except ConnectionFailure:
             pass
+        finally:
+            if not created:
+                # retried on next access to score collection
+                with self.indexes_lock:
+                    self.indexes_thread = None
+
+    def ensure_indexes(self):
+        """
+        Starts index creation in a background thread, unless it is running already.
+        """
+        with self.indexes_lock:
+            if self.indexes_thread and self.indexes_thread.is_alive():
+                return
+            self.indexes_thread = threading.Thread(target=self.create_indexes, daemon=True)
+            self.indexes_thread.start()
+
+    def is_ready(self) -> bool:
+        """
+        Readiness probe: checks that MongoDB server is reachable.
+        Uses a separate client with short timeouts, so that a probe does not block the server for long.
+        """
+        try:
+            self.probe_client.admin.command('ping')
+            return True
+        except ConnectionFailure:
+            return False
 
     def cache_get(self, key=None, collection: str = None, target_value_name: str = None):
         """
@@ -33,8 +110,11 @@ class CacheStore:
         :return: Value or None.
         """
         try:
-            return dict(getattr(self, f'{collection}').find_one({"_id": key}))[target_value_name]
+            result = dict(getattr(self, f'{collection}').find_one({"_id": key}))[target_value_name]
+            METRICS.incr(f'store_{collection}_hit')
+            return result
         except ConnectionFailure:
+            METRICS.incr('store_errors')
             n = 0
             result = None
             while not result or n == 5:
@@ -42,6 +122,7 @@ class CacheStore:
                 n += 1
             return result
         except TypeError:
+            METRICS.incr(f'store_{collection}_miss')
             return None
 
     def cache_set(self, key, value, expire_after_seconds=3600, collection: str = None, target_value_name: str = None):
@@ -54,9 +135,101 @@ class CacheStore:
             else:
                 getattr(self, f'{collection}').insert_one({'_id': key, f'{target_value_name}': value})
         except ConnectionFailure:
-            pass
+            METRICS.incr('store_errors')
         except DuplicateKeyError:
             pass
 
+    def set_many(self, items: dict, collection: str = None, target_value_name: str = None,
+                 chunk_size: int = STORE_CHUNK_SIZE):
+        """
+        Set values for many keys without expiration. Existing documents are replaced.
+        Documents are written in bulk, 'chunk_size' documents per request.
+
+        :param items: dict of keys and values;
+        :param collection: 'score_collection', 'cid_interests_collection';
+        :param target_value_name: 'score', 'interests';
+        :param chunk_size: number of documents per request.
+        """
+        items = list(items.items())
+        for start in range(0, len(items), chunk_size):
+            requests = [ReplaceOne({'_id': key}, {'_id': key, f'{target_value_name}': value}, upsert=True)
+                        for key, value in items[start:start + chunk_size]]
+            try:
+                getattr(self, f'{collection}').bulk_write(requests, ordered=False)
+            except ConnectionFailure:
+                METRICS.incr('store_errors')
+                raise
+
     def get(self, key):
-        return self.cache_get(key=key, collection='cid_interests_collection', target_value_name='interests')
\ No newline at end of file
+        return self.cache_get(key=key, collection='cid_interests_collection', target_value_name='interests')
+
+    def get_many(self, keys: list, chunk_size: int = STORE_CHUNK_SIZE) -> dict:
+        """
+        Get clients' interests for many keys. Keys are fetched in chunks of 'chunk_size' keys per query,
+        so memory and query size stay bounded for long key lists.
+
+        :param keys: list of lookup keys;
+        :param chunk_size: number of keys per query;
+        :return: dict of found keys and interests.
+        """
+        result = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            try:
+                documents = self.cid_interests_collection.find({'_id': {'$in': chunk}}, {'interests': 1})
+                found = {document['_id']: document['interests'] for document in documents}
+            except ConnectionFailure:
+                METRICS.incr('store_errors')
+                raise
+            METRICS.incr('store_cid_interests_collection_hit', len(found))
+            METRICS.incr('store_cid_interests_collection_miss', len(chunk) - len(found))
+            result.update(found)
+        return result
+
+
+class MemoryStore:
+    """
+    In-process stand-in for CacheStore with the same interface.
+    Keeps documents in dicts, so it needs no MongoDB server. Used for load tests and tooling.
+    """
+
+    def __init__(self):
+        self.score_collection = {}
+        self.cid_interests_collection = {}
+
+    def cache_get(self, key=None, collection: str = None, target_value_name: str = None):
+        document = getattr(self, f'{collection}').get(key)
+
+        if document is None or ('expireAt' in document and document['expireAt'] <= utcnow()):
+            METRICS.incr(f'store_{collection}_miss')
+            return None
+
+        METRICS.incr(f'store_{collection}_hit')
+        return document[target_value_name]
+
+    def cache_set(self, key, value, expire_after_seconds=3600, collection: str = None, target_value_name: str = None):
+        documents = getattr(self, f'{collection}')
+        document = documents.get(key)
+
+        # same as insert_one with a duplicate key, an alive document is kept
+        if document is not None and not ('expireAt' in document and document['expireAt'] <= utcnow()):
+            return
+
+        documents[key] = {'_id': key, f'{target_value_name}': value}
+        if expire_after_seconds:
+            documents[key]['expireAt'] = utcnow() + dt.timedelta(0, expire_after_seconds)
+
+    def get(self, key):
+        return self.cache_get(key=key, collection='cid_interests_collection', target_value_name='interests')
+
+    def set_many(self, items: dict, collection: str = None, target_value_name: str = None,
+                 chunk_size: int = STORE_CHUNK_SIZE):
+        documents = getattr(self, f'{collection}')
+        for key, value in items.items():
+            documents[key] = {'_id': key, f'{target_value_name}': value}
+
+    def get_many(self, keys: list, chunk_size: int = STORE_CHUNK_SIZE) -> dict:
+        return {key: value for key, value in ((key, self.get(key)) for key in keys) if value is not None}
+
+    def is_ready(self) -> bool:
+        return True
@@ -1,15 +1,27 @@
 import json
+import os
 import random
+import subprocess
+import sys
+import threading
 import unittest
+from unittest import mock
+from http.client import HTTPConnection
+from http.server import HTTPServer
 
 from hashlib import sha512
 import datetime as dt
-from time import sleep
+from time import sleep, perf_counter
 from functools import wraps
 
 from pymongo import MongoClient
 
 import api
+import dates
+import interests
+import json_codec
+import metrics
+import response_cache
 from copy import deepcopy
 
 import store
@@ -41,6 +53,10 @@ full_set_of_arguments = dict(first_name="vavrew",
 
 score_request = api.OnlineScoreRequest(**full_set_of_arguments)
 
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+# seconds, which `import api` may take
+IMPORT_TIME_BUDGET = 2.0
+
 
 def case(data):
     def decorator(f):
@@ -158,6 +174,24 @@ class TestFields(unittest.TestCase):
         birthday = api.BirthDayField(required=False, nullable=True)
         self.assertFalse(is_value_valid(birthday, val))
 
+    @case([("01.12.2001", dt.date(2010, 1, 1)), ("01.12.1990", dt.date(2060, 11, 1))])
+    def test_BirthDayField_today_pass(self, val, today):
+        birthday = api.BirthDayField(required=False, nullable=True)
+        birthday.validate(val, today)
+
+    @case([("01.12.2001", dt.date(2001, 12, 1)), ("01.12.1990", dt.date(2060, 12, 2))])
+    def test_BirthDayField_today_fail(self, val, today):
+        birthday = api.BirthDayField(required=False, nullable=True)
+        self.assertRaises(api.ValidationError, birthday.validate, val, today)
+
+    @case(["01.12.2001", '29.02.2000', '1.2.1990', '01.2.1990'])
+    def test_parse_date_pass(self, val):
+        self.assertEqual(dates.parse_date(val), dt.datetime.strptime(val, dates.DATE_FORMAT).date())
+
+    @case(["01.12.201", '31.02.2000', '00.01.2000', '01-12-2001', '01.12.20011', 'fasf', ''])
+    def test_parse_date_fail(self, val):
+        self.assertRaises(ValueError, dates.parse_date, val)
+
     @case([0, 1, 2])
     def test_GenderField_pass(self, val):
         gender = api.GenderField(required=False, nullable=True)
@@ -178,6 +212,11 @@ class TestFields(unittest.TestCase):
         client_ids = api.ClientIDsField(required=True)
         self.assertFalse(is_value_valid(client_ids, val))
 
+    def test_ClientIDsField_max_length(self):
+        client_ids = api.ClientIDsField(required=True, max_length=3)
+        self.assertTrue(is_value_valid(client_ids, [1, 2, 3]))
+        self.assertFalse(is_value_valid(client_ids, [1, 2, 3, 4]))
+
     @case([dict(), {'asd': 123, 'asqq': 'dsa'}])
     def test_ArgumentsField_pass(self, val):
         arguments = api.ArgumentsField(required=True, nullable=True)
@@ -259,6 +298,29 @@ class TestRequests(unittest.TestCase):
         _, code = self.get_response({})
         self.assertEqual(api.INVALID_REQUEST, code)
 
+    @case([api.MethodRequest, api.OnlineScoreRequest, api.ClientsInterestsRequest])
+    def test_request_slots(self, request_class):
+        request = request_class()
+        self.assertFalse(hasattr(request, '__dict__'))
+        self.assertTrue(all(getattr(request, field_name) is None for field_name in request_class.fields))
+
+    def test_unknown_arguments_ignored(self):
+        request = api.OnlineScoreRequest(phone="77777777777", email="asda@asda", unknown_field=1)
+        request.validate()
+        self.assertFalse(request.bad_fields)
+        self.assertEqual(request.non_empty_fields, {"phone", "email"})
+
+    @case([
+        # Missing required field
+        ({'client_ids': None}, {'client_ids'}),
+        ({'date': '01.02.2002'}, {'client_ids'}),
+        # Bad optional field
+        ({'client_ids': [1], 'date': '2002.02.01'}, {'date'})])
+    def test_validation_plan_bad_fields(self, value_set, bad_fields):
+        request = api.ClientsInterestsRequest(**value_set)
+        request.validate()
+        self.assertEqual(set(request.bad_fields), bad_fields)
+
 
 class TestAuth(unittest.TestCase):
     @case([VALID_USER_VALUE_SET,
@@ -284,6 +346,25 @@ class TestAuth(unittest.TestCase):
         bad_request_object = api.MethodRequest(**value_set)
         self.assertFalse(api.check_auth(bad_request_object))
 
+    @case([None, 1, 'ы'])
+    def test_check_non_ascii_or_missing_token_fail(self, token):
+        value_set = deepcopy(VALID_USER_VALUE_SET)
+        value_set['method'] = '--'
+        value_set['token'] = token
+        self.assertFalse(api.check_auth(api.MethodRequest(**value_set)))
+
+    def test_user_token_cached(self):
+        api.user_token.cache_clear()
+        for _ in range(3):
+            self.assertEqual(api.user_token(VALID_USER_VALUE_SET['account'], VALID_USER_VALUE_SET['login']),
+                             VALID_USER_VALUE_SET['token'])
+        self.assertEqual(api.user_token.cache_info().hits, 2)
+
+    def test_admin_token_refresh(self):
+        api._admin_token = (0.0, 'expired_token')
+        self.assertEqual(api.admin_token(), make_token(admin=True, salt=api.ADMIN_SALT))
+        self.assertGreater(api._admin_token[0], dt.datetime.now().timestamp())
+
 
 class TestScore(unittest.TestCase):
     def setUp(self):
@@ -435,6 +516,18 @@ class TestMethodHandler(unittest.TestCase):
         # response code is OK
         self.assertEquals(code, api.OK)
 
+    def test_clients_interests_too_many_ids(self):
+        value_set = deepcopy(VALID_USER_VALUE_SET)
+        value_set['method'] = "clients_interests"
+        value_set['arguments'] = {'client_ids': list(range(api.MAX_CLIENT_IDS + 1))}
+
+        response, code = api.clients_interests(api.MethodRequest(**value_set), ctx=dict(), store=self.store)
+        self.assertEqual(code, api.INVALID_REQUEST)
+
+    def test_get_many_in_chunks(self):
+        keys = ["i:%s" % i for i in range(1, 4)] + ['i:absent']
+        self.assertEqual(set(self.store.get_many(keys, chunk_size=2)), set(keys[:-1]))
+
     @case([dict()])
     def test_clients_interests_fail(self, value_set):
         bad_resp, code = api.clients_interests(request=value_set, ctx=dict(), store=self.store)
@@ -519,6 +612,16 @@ class TestStore(unittest.TestCase):
                                             target_value_name='score')
         self.assertIsNotNone(stored_value)
 
+    def test_load_interests(self):
+        cids = range(1001, 1011)
+        interests.load_interests(self.store, interests.random_interests(cids), chunk_size=3)
+        self.assertTrue(all(isinstance(self.store.get(f'i:{cid}'), int) for cid in cids))
+        self.assertTrue(all(len(client_interests) == 2 for client_interests
+                            in api.get_clients_interests(store=self.store, cids=cids).values()))
+
+    def test_is_ready(self):
+        self.assertTrue(self.store.is_ready())
+
     def test_timeout_cache(self):
         key = 'some key'
         self.store.cache_set(key=key,
@@ -533,5 +636,313 @@ class TestStore(unittest.TestCase):
         self.assertIsNone(stored_value)
 
 
+class TestStartup(unittest.TestCase):
+    def test_import_time(self):
+        # neither import, nor client creation should wait for MongoDB server
+        started = perf_counter()
+        subprocess.run([sys.executable, '-c', 'import api; api.MainHTTPHandler.store.db'],
+                       cwd=PROJECT_DIR, check=True, timeout=30)
+        self.assertLess(perf_counter() - started, IMPORT_TIME_BUDGET)
+
+    def test_store_is_lazy(self):
+        cache_store = store.CacheStore(db=store.CACHE_DB,
+                                       score_collection=store.SCORE_CACHE_COLLECTION,
+                                       cid_interests_collection=store.CID_INTERESTS_COLLECTION)
+        self.assertIsNone(cache_store.indexes_thread)
+
+    def test_indexes_started_once(self):
+        cache_store = store.CacheStore(db=store.CACHE_DB,
+                                       score_collection=store.SCORE_CACHE_COLLECTION,
+                                       cid_interests_collection=store.CID_INTERESTS_COLLECTION)
+        started, release = threading.Event(), threading.Event()
+        db = mock.MagicMock()
+        db.score_cache.create_index.side_effect = lambda *args, **kwargs: started.set() or release.wait(5)
+
+        with mock.patch.object(store.CacheStore, 'db', new_callable=mock.PropertyMock, return_value=db):
+            cache_store.ensure_indexes()
+            started.wait(5)
+            thread = cache_store.indexes_thread
+            cache_store.ensure_indexes()
+            self.assertIs(cache_store.indexes_thread, thread)
+            release.set()
+            thread.join(5)
+        self.assertEqual(db.score_cache.create_index.call_count, 1)
+        self.assertIs(cache_store.indexes_thread, thread)
+
+    def test_indexes_retried_after_error(self):
+        cache_store = store.CacheStore(db=store.CACHE_DB,
+                                       score_collection=store.SCORE_CACHE_COLLECTION,
+                                       cid_interests_collection=store.CID_INTERESTS_COLLECTION)
+        db = mock.MagicMock()
+        db.score_cache.create_index.side_effect = RuntimeError('unexpected')
+
+        with mock.patch.object(store.CacheStore, 'db', new_callable=mock.PropertyMock, return_value=db), \
+                mock.patch('threading.excepthook'):
+            cache_store.ensure_indexes()
+            cache_store.indexes_thread.join(5)
+        self.assertIsNone(cache_store.indexes_thread)
+
+    def test_is_ready_timeout(self):
+        cache_store = store.CacheStore(db=store.CACHE_DB,
+                                       score_collection=store.SCORE_CACHE_COLLECTION,
+                                       cid_interests_collection=store.CID_INTERESTS_COLLECTION)
+        # nothing listens on port 1
+        unreachable = MongoClient('localhost', 1, **store.PROBE_CLIENT_OPTIONS)
+        with mock.patch.object(store.CacheStore, '_probe_client', unreachable):
+            started = perf_counter()
+            self.assertFalse(cache_store.is_ready())
+        self.assertLess(perf_counter() - started, 2)
+
+
+class TestMemoryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = store.MemoryStore()
+
+    def test_save_and_get_value(self):
+        self.store.cache_set(key='key', value=5, collection='score_collection', target_value_name='score')
+        # alive documents are not overwritten, same as with duplicate keys in MongoDB
+        self.store.cache_set(key='key', value=3, collection='score_collection', target_value_name='score')
+        self.assertEqual(self.store.cache_get('key', collection='score_collection', target_value_name='score'), 5)
+
+    def test_expired_value(self):
+        self.store.cache_set(key='key', value=5, expire_after_seconds=-1,
+                             collection='score_collection', target_value_name='score')
+        self.assertIsNone(self.store.cache_get('key', collection='score_collection', target_value_name='score'))
+
+    def test_clients_interests(self):
+        self.store.cache_set(key='i:1', value=json.dumps(['cars', 'pets']), expire_after_seconds=None,
+                             collection='cid_interests_collection', target_value_name='interests')
+        self.assertEqual(api.get_interests(store=self.store, cid=1), ['cars', 'pets'])
+        self.assertEqual(api.get_interests(store=self.store, cid=2), [])
+        self.assertEqual(api.get_clients_interests(store=self.store, cids=[1, 2]), {1: ['cars', 'pets'], 2: []})
+
+
+class TestInterests(unittest.TestCase):
+    def setUp(self):
+        self.store = store.MemoryStore()
+
+    @case([[], ['cars'], ['cars', 'pets'], ['otus', 'cars', 'geek']])
+    def test_vocabulary_round_trip(self, client_interests):
+        vocabulary = interests.Vocabulary(interests.SAMPLE_INTERESTS)
+        encoded = vocabulary.encode(client_interests)
+
+        self.assertIsInstance(encoded, int)
+        self.assertEqual(sorted(vocabulary.decode(encoded)), sorted(client_interests))
+
+    def test_large_vocabulary(self):
+        vocabulary = interests.Vocabulary(str(word_id) for word_id in range(interests.MAX_MASK_BITS))
+        encoded = vocabulary.encode(['0', 'new word'])
+
+        self.assertEqual(encoded, [0, interests.MAX_MASK_BITS])
+        self.assertEqual(vocabulary.decode(encoded), ['0', 'new word'])
+
+    def test_load_and_get_interests(self):
+        data = interests.random_interests(range(1, 11))
+        self.assertEqual(interests.load_interests(self.store, data, chunk_size=3), 10)
+        self.assertIsInstance(self.store.get('i:1'), int)
+        # interests are sets of words, order is not kept
+        self.assertEqual({cid: sorted(client_interests) for cid, client_interests
+                          in api.get_clients_interests(store=self.store, cids=range(1, 12)).items()},
+                         {**{cid: sorted(client_interests) for cid, client_interests in data.items()}, 11: []})
+
+    def test_vocabulary_reload(self):
+        interests.load_interests(self.store, {1: ['cars']})
+        self.assertEqual(api.get_interests(store=self.store, cid=1), ['cars'])
+
+        # another loader adds new words after vocabulary has been loaded and cached
+        vocabulary = interests.Vocabulary(['cars'])
+        encoded = vocabulary.encode(['music', 'books'])
+        self.store.set_many({interests.VOCABULARY_KEY: vocabulary.words},
+                            collection=interests.INTERESTS_COLLECTION,
+                            target_value_name=interests.VOCABULARY_VALUE_NAME)
+        self.store.set_many({'i:2': encoded}, collection=interests.INTERESTS_COLLECTION,
+                            target_value_name=interests.INTERESTS_VALUE_NAME)
+        self.assertEqual(len(interests.get_vocabulary(self.store).words), 1)
+        self.assertEqual(sorted(api.get_interests(store=self.store, cid=2)), ['books', 'music'])
+
+    @case([0b1011, [0, 70]])
+    def test_unknown_words_skipped(self, value):
+        interests.load_interests(self.store, {1: ['cars', 'pets']})
+        self.store.set_many({'i:2': value}, collection=interests.INTERESTS_COLLECTION,
+                            target_value_name=interests.INTERESTS_VALUE_NAME)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(api.get_interests(store=self.store, cid=2),
+                             ['cars', 'pets'] if isinstance(value, int) else ['cars'])
+
+    def test_legacy_json_interests(self):
+        self.assertEqual(interests.decode_interests(self.store, json.dumps(['cars', 'pets'])), ['cars', 'pets'])
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_disabled_by_default(self):
+        self.assertFalse(response_cache.ResponseCache().enabled)
+
+    def test_key_normalisation(self):
+        make_key = response_cache.ResponseCache.make_key
+        self.assertEqual(make_key('clients_interests', [3, 1, 2, 1], '01.02.2002'),
+                         make_key('clients_interests', {1, 2, 3}, '01.02.2002'))
+        self.assertNotEqual(make_key('clients_interests', [1, 2, 3], '01.02.2002'),
+                            make_key('clients_interests', [1, 2, 3], None))
+
+    def test_ttl(self):
+        cache = response_cache.ResponseCache(ttl=0.05)
+        cached = cache.set('key', b'body')
+
+        self.assertEqual(cache.get('key'), cached)
+        self.assertEqual(cached.etag, response_cache.make_etag(b'body'))
+        sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+
+    def test_eviction(self):
+        cache = response_cache.ResponseCache(ttl=60, max_entries=2, max_bytes=9)
+        cache.set(1, b'1234')
+        cache.set(2, b'1234')
+        cache.get(1)
+        cache.set(3, b'1234')
+        # least recently used entry is evicted
+        self.assertEqual(set(cache.entries), {1, 3})
+
+        cache.set(4, b'123456')
+        # size limit
+        self.assertEqual(set(cache.entries), {4})
+        self.assertEqual(cache.size, 6)
+
+
+class TestJSONCodec(unittest.TestCase):
+    @case(list(json_codec.CODECS))
+    def test_codec_round_trip(self, codec_name):
+        codec = json_codec.get_codec(codec_name)
+        response = {"response": {1: ["cars", "pets"], 2: ["музыка"]}, "code": api.OK}
+
+        encoded = codec.dumps(response)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(codec.loads(encoded), json.loads(json.dumps(response)))
+
+    def test_default_codec(self):
+        self.assertIn(json_codec.get_codec().name, json_codec.CODECS)
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, json_codec.get_codec, 'pickle')
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        histogram = metrics.Histogram(bounds=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.snapshot(), {'buckets': {'0.1': 2, '1.0': 3, '+Inf': 4},
+                                                'count': 4,
+                                                'sum': 5.65})
+
+    def test_timed(self):
+        ctx = {}
+        for _ in range(2):
+            with metrics.timed(ctx, metrics.STORE):
+                sleep(0.01)
+
+        self.assertGreaterEqual(ctx['timings'][metrics.STORE], 0.02)
+
+    def test_method_handler_timings(self):
+        ctx = {}
+        api.method_handler({"body": {**VALID_USER_VALUE_SET, 'method': 'online_score', 'token': 'bad_token'},
+                            "headers": dict()}, ctx, store=None)
+
+        self.assertEqual(ctx['method'], 'online_score')
+        self.assertEqual(set(ctx['timings']), {metrics.VALIDATION, metrics.AUTH})
+
+
+class TestHTTPHandler(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("localhost", 0), api.MainHTTPHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def get_response(self, method, path, body=None, headers=None):
+        connection = HTTPConnection(*self.server.server_address, timeout=10)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+    def test_online_score(self):
+        body = json.dumps({**VALID_USER_VALUE_SET, 'method': 'online_score'}).encode()
+        response, data = self.get_response("POST", "/method/", body=body)
+
+        self.assertEqual(response.status, api.OK)
+        self.assertEqual(int(response.getheader("Content-Length")), len(data))
+        self.assertIn('score', json.loads(data)['response'])
+
+    def test_metrics(self):
+        metrics.METRICS.reset()
+        body = json.dumps({**VALID_USER_VALUE_SET, 'method': 'online_score'}).encode()
+        self.get_response("POST", "/method/", body=body)
+        response, data = self.get_response("GET", "/metrics")
+        snapshot = json.loads(data)
+
+        self.assertEqual(response.status, api.OK)
+        self.assertEqual(snapshot['counters']['responses_200'], 1)
+        for phase in metrics.PHASES + (metrics.TOTAL,):
+            self.assertEqual(snapshot['latency']['online_score'][phase]['count'], 1)
+
+    def test_body_too_large(self):
+        body = json.dumps({**VALID_USER_VALUE_SET, 'method': 'online_score'}).encode()
+        api.MainHTTPHandler.max_body_size = len(body) - 1
+        try:
+            response, data = self.get_response("POST", "/method/", body=body)
+        finally:
+            api.MainHTTPHandler.max_body_size = api.MAX_BODY_SIZE
+
+        self.assertEqual(response.status, api.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(json.loads(data)['code'], api.REQUEST_ENTITY_TOO_LARGE)
+
+    def test_negative_content_length(self):
+        response, _ = self.get_response("POST", "/method/", body=b'{}', headers={"Content-Length": "-1"})
+        self.assertEqual(response.status, api.BAD_REQUEST)
+
+    def test_clients_interests_etag(self):
+        body = json.dumps({**VALID_USER_VALUE_SET,
+                           'method': 'clients_interests',
+                           'arguments': {'client_ids': [3, 1, 2]}}).encode()
+        same_ids_body = json.dumps({**VALID_USER_VALUE_SET,
+                                    'method': 'clients_interests',
+                                    'arguments': {'client_ids': [1, 2, 3, 3]}}).encode()
+        response_cache.RESPONSE_CACHE.configure(ttl=60)
+        try:
+            response, data = self.get_response("POST", "/method/", body=body)
+            cached_response, cached_data = self.get_response("POST", "/method/", body=same_ids_body)
+            not_modified, not_modified_data = self.get_response("POST", "/method/", body=body,
+                                                                headers={"If-None-Match": response.getheader("ETag")})
+        finally:
+            response_cache.RESPONSE_CACHE.configure(ttl=0)
+
+        self.assertEqual(response.status, api.OK)
+        self.assertIsNotNone(response.getheader("ETag"))
+        self.assertEqual(cached_response.getheader("ETag"), response.getheader("ETag"))
+        self.assertEqual(cached_data, data)
+        self.assertEqual(not_modified.status, api.NOT_MODIFIED)
+        self.assertEqual(not_modified_data, b'')
+
+    def test_get_unknown_path(self):
+        response, _ = self.get_response("GET", "/unknown")
+        self.assertEqual(response.status, api.NOT_FOUND)
+
+    @case([(b'not a json', api.BAD_REQUEST),
+           (json.dumps({**VALID_USER_VALUE_SET, 'method': 'online_score'}).encode(), api.NOT_FOUND)])
+    def test_bad_request(self, body, code):
+        path = "/method/" if code != api.NOT_FOUND else "/unknown/"
+        response, data = self.get_response("POST", path, body=body)
+
+        self.assertEqual(response.status, code)
+        self.assertEqual(json.loads(data)['code'], code)
+
+
 if __name__ == "__main__":
     unittest.main()